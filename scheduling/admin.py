@@ -1,5 +1,50 @@
-from django.contrib import admin
-from .models import Employee, Location, Holiday, EmployeeOffDay, Schedule
+from contextlib import contextmanager
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.db import router, transaction
+from django.db.models import Count
+from . import archive, events, ledger
+from .models import (
+    Employee, Location, Holiday, EmployeeOffDay, Schedule, EmployeeWorkload, GenerationJob,
+    ShiftTemplate, ShiftDemand, ScheduleArchive
+)
+from .filters import EstimatedCountPaginator, EmployeeFilter, DateRangeFilter, ShiftFilter
+from .ical import invalidate_employee_feeds, invalidate_all_feeds
+
+
+class ReassignActionForm(ActionForm):
+    employee = forms.IntegerField(
+        required=False,
+        label='Employee ID',
+        help_text='Target employee for the reassign action'
+    )
+
+
+class ScheduleAdminForm(forms.ModelForm):
+    shift = forms.ChoiceField()
+
+    class Meta:
+        model = Schedule
+        fields = '__all__'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Shift times and the late-shift tally are looked up by code, so only
+        # template codes are accepted; a row keeps the code of a removed template
+        choices = list(ShiftTemplate.objects.values_list('code', 'label'))
+        if self.instance.shift and self.instance.shift not in dict(choices):
+            choices.append((self.instance.shift, self.instance.shift))
+        self.fields['shift'].choices = choices
+
+    def clean(self):
+        cleaned_data = super().clean()
+        days = [cleaned_data.get('date')]
+        if self.instance.pk:
+            days.append(self.instance.date)
+        if archive.archived_months([day for day in days if day]):
+            raise forms.ValidationError('This month is archived; restore it before changing its shifts.')
+        return cleaned_data
 
 
 @admin.register(Employee)
@@ -10,12 +55,59 @@ class EmployeeAdmin(admin.ModelAdmin):
     list_editable = ['is_active']
 
 
+class FeedContentAdmin(admin.ModelAdmin):
+    """Admin for models whose fields appear in every employee feed"""
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        invalidate_all_feeds()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        invalidate_all_feeds()
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        invalidate_all_feeds()
+
+
+class ShiftDemandInline(admin.TabularInline):
+    model = ShiftDemand
+    extra = 0
+    fields = ['weekday', 'shift', 'headcount']
+
+
 @admin.register(Location)
-class LocationAdmin(admin.ModelAdmin):
+class LocationAdmin(FeedContentAdmin):
     list_display = ['name', 'mall_name', 'is_active', 'created_at']
     list_filter = ['is_active', 'created_at']
     search_fields = ['name', 'mall_name', 'address']
     list_editable = ['is_active']
+    inlines = [ShiftDemandInline]
+
+    def delete_model(self, request, obj):
+        with self.deleting_shifts(Schedule.objects.filter(location=obj)):
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with self.deleting_shifts(Schedule.objects.filter(location__in=queryset)):
+            super().delete_queryset(request, queryset)
+
+    @contextmanager
+    def deleting_shifts(self, shifts):
+        """Keep the ledger in step with the shifts a location delete cascades to"""
+        months = set(shifts.values_list('date__month', 'date__year'))
+        with transaction.atomic(using=router.db_for_write(Schedule)):
+            ledger.remove_queryset(shifts)
+            yield
+        for month, year in months:
+            events.publish('updated', month, year, {'source': 'admin'})
+
+
+@admin.register(ShiftTemplate)
+class ShiftTemplateAdmin(FeedContentAdmin):
+    list_display = ['code', 'label', 'start_time', 'end_time', 'is_late', 'order', 'is_active']
+    list_editable = ['order', 'is_active']
 
 
 @admin.register(Holiday)
@@ -29,17 +121,136 @@ class HolidayAdmin(admin.ModelAdmin):
 @admin.register(EmployeeOffDay)
 class EmployeeOffDayAdmin(admin.ModelAdmin):
     list_display = ['employee', 'date', 'reason']
-    list_filter = ['date', 'employee']
+    list_filter = [DateRangeFilter, EmployeeFilter]
+    list_select_related = ['employee']
     search_fields = ['employee__name', 'reason']
-    date_hierarchy = 'date'
+    autocomplete_fields = ['employee']
+    ordering = ['-date']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
 
 
 @admin.register(Schedule)
 class ScheduleAdmin(admin.ModelAdmin):
     list_display = ['employee', 'location', 'date', 'shift', 'created_at']
-    list_filter = ['shift', 'date', 'location', 'created_at']
+    list_filter = [ShiftFilter, DateRangeFilter, 'location', EmployeeFilter]
+    list_select_related = ['employee', 'location']
     search_fields = ['employee__name', 'location__name']
-    date_hierarchy = 'date'
+    autocomplete_fields = ['employee', 'location']
+    ordering = ['-date']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    form = ScheduleAdminForm
+    action_form = ReassignActionForm
+    actions = ['reassign_shifts']
+
+    @admin.action(description='Reassign selected shifts to employee ID')
+    def reassign_shifts(self, request, queryset):
+        employee = Employee.objects.filter(
+            pk=request.POST.get('employee') or None, is_active=True
+        ).first()
+        if employee is None:
+            self.message_user(request, 'Enter the ID of an active employee.', messages.ERROR)
+            return
+
+        if archive.archived_months(queryset.dates('date', 'month')):
+            self.message_user(request, 'Selected shifts include archived months.', messages.ERROR)
+            return
+
+        # An employee works at most one shift per day
+        selected_dates = queryset.values('date')
+        if queryset.values('date').annotate(shifts=Count('id')).filter(shifts__gt=1).exists():
+            self.message_user(request, 'Selected shifts include several on the same day.', messages.ERROR)
+            return
+        if Schedule.objects.filter(employee=employee, date__in=selected_dates).exclude(
+                pk__in=queryset.values('pk')).exists():
+            self.message_user(request, f'{employee.name} is already scheduled on one of these days.', messages.ERROR)
+            return
+        # Off days are not honoured on weekends (week_day 1 is Sunday, 7 Saturday)
+        if EmployeeOffDay.objects.filter(
+                employee=employee, date__in=selected_dates, date__week_day__in=[2, 3, 4, 5, 6]).exists():
+            self.message_user(request, f'{employee.name} has an off day on one of these days.', messages.ERROR)
+            return
+
+        affected = set(queryset.values_list('employee_id', 'date__month', 'date__year'))
+        with transaction.atomic(using=router.db_for_write(Schedule)):
+            ledger.move_queryset(queryset, employee.pk)
+            updated = queryset.update(employee=employee)
+        for employee_id, month, year in affected:
+            invalidate_employee_feeds([employee_id, employee.pk], month, year)
+        self.publish_updates({(month, year) for _employee_id, month, year in affected})
+        self.message_user(request, f'{updated} shifts reassigned to {employee.name}.', messages.SUCCESS)
+
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic(using=router.db_for_write(Schedule)):
+            if change:
+                previous = Schedule.objects.get(pk=obj.pk)
+                ledger.remove([previous])
+                invalidate_employee_feeds([previous.employee_id], previous.date.month, previous.date.year)
+            super().save_model(request, obj, form, change)
+            ledger.add([obj])
+        invalidate_employee_feeds([obj.employee_id], obj.date.month, obj.date.year)
+        self.publish_updates({(obj.date.month, obj.date.year)} | (
+            {(previous.date.month, previous.date.year)} if change else set()
+        ))
+
+    def delete_model(self, request, obj):
+        with transaction.atomic(using=router.db_for_write(Schedule)):
+            ledger.remove([obj])
+            super().delete_model(request, obj)
+        invalidate_employee_feeds([obj.employee_id], obj.date.month, obj.date.year)
+        self.publish_updates({(obj.date.month, obj.date.year)})
+
+    def delete_queryset(self, request, queryset):
+        affected = set(queryset.values_list('employee_id', 'date__month', 'date__year'))
+        with transaction.atomic(using=router.db_for_write(Schedule)):
+            ledger.remove_queryset(queryset)
+            super().delete_queryset(request, queryset)
+        for employee_id, month, year in affected:
+            invalidate_employee_feeds([employee_id], month, year)
+        self.publish_updates({(month, year) for _employee_id, month, year in affected})
+
+    def publish_updates(self, months):
+        # Admin edits can touch many rows, so live views just reload the month
+        for month, year in months:
+            events.publish('updated', month, year, {'source': 'admin'})
+
+
+@admin.register(EmployeeWorkload)
+class EmployeeWorkloadAdmin(admin.ModelAdmin):
+    list_display = ['employee', 'total_shifts', 'weekend_shifts', 'late_shifts', 'updated_at']
+    list_select_related = ['employee']
+    search_fields = ['employee__name']
+    readonly_fields = ['employee', 'total_shifts', 'weekend_shifts', 'late_shifts', 'updated_at']
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(GenerationJob)
+class GenerationJobAdmin(admin.ModelAdmin):
+    list_display = ['month', 'year', 'status', 'shifts_created', 'unfilled_slots', 'duration', 'started_at']
+    list_filter = ['status']
+    readonly_fields = [
+        'month', 'year', 'status', 'shifts_created', 'unfilled_slots', 'duration',
+        'result', 'error', 'started_at', 'finished_at'
+    ]
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(ScheduleArchive)
+class ScheduleArchiveAdmin(admin.ModelAdmin):
+    list_display = ['month', 'year', 'shift_count', 'size', 'path', 'archived_at']
+    list_filter = ['year']
+    readonly_fields = ['month', 'year', 'path', 'shift_count', 'size', 'tallies', 'archived_at']
+
+    def has_add_permission(self, request):
+        return False
 
-    def get_queryset(self, request):
-        return super().get_queryset(request).select_related('employee', 'location')
\ No newline at end of file
+    # Archives are restored with archive_schedules --restore, never dropped
+    def has_delete_permission(self, request, obj=None):
+        return False
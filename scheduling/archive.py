@@ -0,0 +1,194 @@
+"""Cold storage for old schedule months
+
+An archived month lives in one gzip compressed JSON file under
+SCHEDULE_ARCHIVE_DIR, catalogued by a ScheduleArchive row, and its rows are
+removed from the Schedule table. Rows keep the employee and location names
+they had when archived, so an old schedule reads the same after people
+leave or stores are renamed.
+
+Archiving does not touch the workload ledger: archived shifts still count.
+"""
+import calendar
+import gzip
+import json
+import uuid
+from datetime import date, datetime
+from pathlib import Path
+from types import SimpleNamespace
+from django.conf import settings
+from django.db import router, transaction
+from . import events, ledger
+from .ical import invalidate_employee_feeds
+from .models import Employee, Location, Schedule, ScheduleArchive
+from .tenants import get_current_tenant
+
+FORMAT_VERSION = 1
+FIELDS = [
+    'id', 'date', 'shift', 'created_at', 'location_id', 'location_name', 'mall_name', 'address',
+    'employee_id', 'employee_name', 'gender',
+]
+_QUERY_FIELDS = [
+    'id', 'date', 'shift', 'created_at', 'location_id', 'location__name', 'location__mall_name',
+    'location__address', 'employee_id', 'employee__name', 'employee__gender',
+]
+
+
+def archive_root():
+    """Each tenant's months are kept in their own directory"""
+    return Path(settings.SCHEDULE_ARCHIVE_DIR) / (get_current_tenant() or 'default')
+
+
+def _month_schedules(month, year):
+    first_day = date(year, month, 1)
+    last_day = date(year, month, calendar.monthrange(year, month)[1])
+    return Schedule.objects.filter(date__range=(first_day, last_day))
+
+
+def archived_months(days):
+    """The (month, year) pairs among the given dates that are archived"""
+    months = {(day.month, day.year) for day in days}
+    if not months:
+        return set()
+    return {
+        (month, year)
+        for month, year in ScheduleArchive.objects.filter(
+            year__in={year for _month, year in months}
+        ).values_list('month', 'year')
+        if (month, year) in months
+    }
+
+
+def archive_month(month, year):
+    """Move a month out of the Schedule table
+
+    Rows added to a month after it was archived are merged into its
+    archive. Returns the catalog entry, or None if there was nothing to move.
+    """
+    root = archive_root()
+    month_schedules = _month_schedules(month, year)
+
+    with transaction.atomic(using=router.db_for_write(Schedule)):
+        rows = list(month_schedules.order_by('date', 'location__name', 'shift').values_list(*_QUERY_FIELDS))
+        if not rows:
+            return None
+        employee_ids = {row[8] for row in rows}
+        tallies = {str(employee_id): tally for employee_id, tally in ledger.tally_queryset(month_schedules).items()}
+
+        entry = ScheduleArchive.objects.select_for_update().filter(month=month, year=year).first()
+        previous_path = entry.path if entry else None
+        if entry is None:
+            entry = ScheduleArchive(month=month, year=year)
+        else:
+            new_ids = {row[0] for row in rows}
+            archived = [[row[field] for field in FIELDS] for row in _read(entry) if row['id'] not in new_ids]
+            # Sorted like the query: date, location name, shift
+            rows = sorted([*archived, *rows], key=lambda row: (row[1], row[5], row[2]))
+            for employee_id, counters in entry.tallies.items():
+                tally = tallies.setdefault(employee_id, [0, 0, 0])
+                for index, value in enumerate(counters):
+                    tally[index] += value
+
+        # Every write goes to a new file, so the file the catalog currently
+        # points at is never overwritten. The catalog row is saved first: if
+        # that fails nothing has been written yet.
+        entry.path = f'{year}/{year}-{month:02d}-{uuid.uuid4().hex[:8]}.json.gz'
+        entry.shift_count = len(rows)
+        entry.tallies = tallies
+        entry.save()
+
+        path = root / entry.path
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with gzip.open(path, 'xt', encoding='utf-8') as archive_file:
+                json.dump(
+                    {'version': FORMAT_VERSION, 'month': month, 'year': year, 'fields': FIELDS, 'rows': rows},
+                    archive_file, separators=(',', ':'), default=lambda value: value.isoformat()
+                )
+            entry.size = path.stat().st_size
+            entry.save(update_fields=['size'])
+            month_schedules.delete()
+        except BaseException:
+            path.unlink(missing_ok=True)
+            raise
+
+        if previous_path:
+            transaction.on_commit(
+                lambda: (root / previous_path).unlink(missing_ok=True),
+                using=router.db_for_write(Schedule)
+            )
+
+    invalidate_employee_feeds(employee_ids, month, year)
+    events.publish('updated', month, year, {'source': 'archive'})
+    return entry
+
+
+def _read(entry):
+    with gzip.open(archive_root() / entry.path, 'rt', encoding='utf-8') as archive_file:
+        payload = json.load(archive_file)
+    rows = []
+    for values in payload['rows']:
+        row = dict(zip(payload['fields'], values))
+        row['date'] = date.fromisoformat(row['date'])
+        row['created_at'] = datetime.fromisoformat(row['created_at'])
+        rows.append(row)
+    return rows
+
+
+def load(month, year):
+    """An archived month's rows as dicts keyed by FIELDS, or None if the month is not archived"""
+    entry = ScheduleArchive.objects.filter(month=month, year=year).first()
+    return _read(entry) if entry else None
+
+
+def as_schedules(rows):
+    """Stand-ins for Schedule instances that the schedule templates can render"""
+    return [
+        SimpleNamespace(
+            id=row['id'],
+            date=row['date'],
+            shift=row['shift'],
+            created_at=row['created_at'],
+            location=SimpleNamespace(
+                id=row['location_id'], name=row['location_name'],
+                mall_name=row['mall_name'], address=row['address']
+            ),
+            employee=SimpleNamespace(id=row['employee_id'], name=row['employee_name'], gender=row['gender']),
+        )
+        for row in rows
+    ]
+
+
+def restore_month(month, year):
+    """Move an archived month back into the Schedule table
+
+    Returns (restored, skipped); shifts of deleted employees or locations
+    are skipped.
+    """
+    entry = ScheduleArchive.objects.get(month=month, year=year)
+    rows = _read(entry)
+    employee_ids = set(Employee.objects.filter(
+        pk__in={row['employee_id'] for row in rows}
+    ).values_list('pk', flat=True))
+    location_ids = set(Location.objects.filter(
+        pk__in={row['location_id'] for row in rows}
+    ).values_list('pk', flat=True))
+
+    schedules = [
+        Schedule(
+            id=row['id'],
+            employee_id=row['employee_id'],
+            location_id=row['location_id'],
+            date=row['date'],
+            shift=row['shift'],
+        )
+        for row in rows
+        if row['employee_id'] in employee_ids and row['location_id'] in location_ids
+    ]
+    with transaction.atomic(using=router.db_for_write(Schedule)):
+        Schedule.objects.bulk_create(schedules)
+        entry.delete()
+    (archive_root() / entry.path).unlink(missing_ok=True)
+
+    invalidate_employee_feeds({schedule.employee_id for schedule in schedules}, month, year)
+    events.publish('updated', month, year, {'source': 'archive'})
+    return len(schedules), len(rows) - len(schedules)
@@ -0,0 +1,118 @@
+from contextlib import contextmanager
+from django.db import IntegrityError, router, transaction
+from . import archive, events, ledger
+from .ical import invalidate_employee_feeds
+from .models import Employee, EmployeeOffDay, Schedule
+
+
+class ScheduleConflict(ValueError):
+    """Raised when a manual change would break a scheduling rule"""
+
+
+def _check_available(employee, day, exclude_id=None):
+    """Point lookups on the (employee, date) unique indexes"""
+    busy = Schedule.objects.filter(employee_id=employee.pk, date=day)
+    if exclude_id is not None:
+        busy = busy.exclude(pk=exclude_id)
+    if busy.exists():
+        raise ScheduleConflict(f'{employee.name} is already scheduled on {day}.')
+
+    # Off days are not honoured on weekends, same as the generator
+    if day.weekday() < 5 and EmployeeOffDay.objects.filter(employee_id=employee.pk, date=day).exists():
+        raise ScheduleConflict(f'{employee.name} has an off day on {day}.')
+
+
+def _check_not_archived(*days):
+    """Archived months are read-only"""
+    archived = archive.archived_months(days)
+    if archived:
+        month, year = min(archived, key=lambda pair: (pair[1], pair[0]))
+        raise ScheduleConflict(f'{month:02d}/{year} is archived; restore it before changing shifts.')
+
+
+@contextmanager
+def _changing():
+    """Transaction for a manual change
+
+    select_for_update does not lock anything on SQLite, so a concurrent
+    change can still claim the employee's day between the checks and the
+    write; the (employee, date) constraint then turns it into a conflict.
+    """
+    try:
+        with transaction.atomic(using=router.db_for_write(Schedule)):
+            yield
+    except IntegrityError:
+        raise ScheduleConflict('The schedule was changed at the same time; reload and try again.') from None
+
+
+def _lock(schedule_id):
+    return Schedule.objects.select_for_update().select_related('employee', 'location').get(pk=schedule_id)
+
+
+def reassign(schedule_id, employee_id):
+    """Give one shift to another active employee"""
+    with _changing():
+        schedule = _lock(schedule_id)
+        employee = Employee.objects.get(pk=employee_id, is_active=True)
+        previous_id = schedule.employee_id
+        if employee.pk == previous_id:
+            return schedule
+
+        _check_not_archived(schedule.date)
+        _check_available(employee, schedule.date)
+        ledger.remove([schedule])
+        schedule.employee = employee
+        schedule.save(update_fields=['employee'])
+        ledger.add([schedule])
+
+    invalidate_employee_feeds([previous_id, employee.pk], schedule.date.month, schedule.date.year)
+    events.publish('reassigned', schedule.date.month, schedule.date.year, {
+        'shifts': [events.shift_payload(schedule)]
+    })
+    return schedule
+
+
+def swap(first_id, second_id):
+    """Swap the employees of two shifts
+
+    The rows exchange their date, location and shift instead of their
+    employees, which never collides with the (employee, date) constraint even
+    when both shifts are on the same day.
+    """
+    if first_id == second_id:
+        raise ScheduleConflict('A shift cannot be swapped with itself.')
+
+    with _changing():
+        first, second = _lock(first_id), _lock(second_id)
+        _check_not_archived(first.date, second.date)
+        if first.date != second.date:
+            _check_available(first.employee, second.date, exclude_id=first.pk)
+            _check_available(second.employee, first.date, exclude_id=second.pk)
+
+        ledger.remove([first, second])
+        first_slot = (first.date, first.location, first.shift)
+        first.date, first.location, first.shift = second.date, second.location, second.shift
+        second.date, second.location, second.shift = first_slot
+        first.save(update_fields=['date', 'location', 'shift'])
+        second.save(update_fields=['date', 'location', 'shift'])
+        ledger.add([first, second])
+
+    for day in {first.date, second.date}:
+        invalidate_employee_feeds([first.employee_id, second.employee_id], day.month, day.year)
+    for month, year in {(first.date.month, first.date.year), (second.date.month, second.date.year)}:
+        events.publish('swapped', month, year, {
+            'shifts': [events.shift_payload(first), events.shift_payload(second)]
+        })
+    return first, second
+
+
+def unassign(schedule_id):
+    """Remove one shift from the schedule"""
+    with transaction.atomic(using=router.db_for_write(Schedule)):
+        schedule = _lock(schedule_id)
+        ledger.remove([schedule])
+        schedule.delete()
+
+    invalidate_employee_feeds([schedule.employee_id], schedule.date.month, schedule.date.year)
+    events.publish('unassigned', schedule.date.month, schedule.date.year, {'shifts': [{'id': schedule_id}]})
+    return schedule
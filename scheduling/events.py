@@ -0,0 +1,147 @@
+"""Live schedule change events
+
+Changes are written to the ScheduleChange log and pushed straight to the
+event streams open in this process. Streams also poll the log every
+POLL_INTERVAL seconds, which picks up changes made by other worker
+processes and lets a reconnecting client resume from Last-Event-ID.
+
+Job progress events are only pushed in-process; they are not worth a row.
+Streams are served under ASGI only, see stream_available().
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db import router, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import ScheduleChange
+from .tenants import get_current_tenant, use_tenant
+
+POLL_INTERVAL = 15
+RETENTION = timedelta(days=1)
+
+_subscribers = defaultdict(set)
+_lock = threading.Lock()
+
+
+def stream_available(request):
+    """Event streams are only served under ASGI
+
+    A WSGI worker would be tied up for as long as the stream stays open,
+    which is forever.
+    """
+    return isinstance(request, ASGIRequest)
+
+
+def shift_payload(schedule):
+    """Compact description of a shift for event clients"""
+    return {
+        'id': schedule.id,
+        'date': schedule.date.isoformat(),
+        'shift': schedule.shift,
+        'location': schedule.location.name,
+        'employee': schedule.employee.name,
+        'gender': schedule.employee.gender,
+    }
+
+
+def _broadcast(topic, event):
+    with _lock:
+        subscribers = list(_subscribers.get(topic, ()))
+    for loop, queue in subscribers:
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+        except RuntimeError:
+            # The stream's event loop has shut down
+            pass
+
+
+def publish(kind, month, year, data, persist=True):
+    """Record a change to a month's schedule and push it to open streams
+
+    Inside a transaction the event is held back until it commits.
+    """
+    topic = (get_current_tenant(), month, year)
+    if not persist:
+        _broadcast(topic, {'id': None, 'kind': kind, 'data': data})
+        return
+
+    def record():
+        change = ScheduleChange.objects.create(month=month, year=year, kind=kind, data=data)
+        _broadcast(topic, {'id': change.id, 'kind': kind, 'data': data})
+
+    transaction.on_commit(record, using=router.db_for_write(ScheduleChange))
+
+
+def prune():
+    """Drop change log rows older than RETENTION"""
+    return ScheduleChange.objects.filter(created_at__lt=timezone.now() - RETENTION).delete()[0]
+
+
+def _changes_since(month, year, last_id):
+    return [
+        {'id': change_id, 'kind': kind, 'data': data}
+        for change_id, kind, data in ScheduleChange.objects.filter(
+            year=year, month=month, id__gt=last_id
+        ).values_list('id', 'kind', 'data')
+    ]
+
+
+def _latest_id(month, year):
+    return ScheduleChange.objects.filter(year=year, month=month).aggregate(last=Max('id'))['last'] or 0
+
+
+def _format(event):
+    lines = [f"id: {event['id']}"] if event['id'] else []
+    lines.append(f"event: {event['kind']}")
+    lines.append(f"data: {json.dumps(event['data'], separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
+
+
+async def stream(tenant, month, year, last_id=None):
+    """Server-sent events for one month of one tenant's schedule
+
+    The tenant is passed in because the request's context is gone by the
+    time the response is iterated.
+    """
+    def query(function, *args):
+        with use_tenant(tenant):
+            return function(*args)
+
+    topic = (tenant, month, year)
+    queue = asyncio.Queue()
+    subscriber = (asyncio.get_running_loop(), queue)
+    with _lock:
+        _subscribers[topic].add(subscriber)
+
+    try:
+        if last_id is None:
+            last_id = await sync_to_async(query)(_latest_id, month, year)
+            pending = []
+        else:
+            pending = await sync_to_async(query)(_changes_since, month, year, last_id)
+        yield f'retry: {POLL_INTERVAL * 1000}\n\n'
+
+        while True:
+            for event in pending:
+                if event['id'] is None or event['id'] > last_id:
+                    last_id = event['id'] or last_id
+                    yield _format(event)
+            try:
+                pending = [await asyncio.wait_for(queue.get(), POLL_INTERVAL)]
+            except asyncio.TimeoutError:
+                pending = await sync_to_async(query)(_changes_since, month, year, last_id)
+                if not pending:
+                    # Keeps proxies from closing an idle connection
+                    yield ': keepalive\n\n'
+    finally:
+        with _lock:
+            _subscribers[topic].discard(subscriber)
+            if not _subscribers[topic]:
+                del _subscribers[topic]
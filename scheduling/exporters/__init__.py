@@ -0,0 +1,82 @@
+"""Schedule exporters
+
+Backends are registered by module path and only imported the first time
+they are used, so heavy dependencies such as openpyxl stay out of worker
+start-up. A backend module provides:
+
+    LABEL         human readable name
+    CONTENT_TYPE  MIME type of the export
+    EXTENSION     file extension, without the dot
+    export(month, year) -> bytes or a binary file object
+"""
+import calendar
+import importlib
+from datetime import date
+
+HEADERS = ['Date', 'Day', 'Location', 'Shift', 'Employee', 'Gender']
+
+_registry = {}
+
+
+def register(name, module_path):
+    """Register an exporter backend by its dotted module path"""
+    _registry[name] = module_path
+
+
+def get_exporter(name):
+    """Import (on first use) and return the backend module for name"""
+    try:
+        module_path = _registry[name]
+    except KeyError:
+        raise LookupError(f'Unknown export format: {name}')
+    return importlib.import_module(module_path)
+
+
+def available_formats():
+    return list(_registry)
+
+
+def location_label(name, mall_name):
+    # Mirrors Location.__str__ without loading model instances
+    return f"{name} - {mall_name}" if mall_name else name
+
+
+def month_rows(month, year):
+    """Fetch a month's schedule as plain export rows in a single query
+
+    Each row is (location id, date, location label, shift, employee name,
+    gender); everything after the location id is what build_workbook expects.
+    Archived months are read from their archive file.
+    """
+    # Imported here so process pool workers can load the workbook backend
+    # without setting up Django
+    from .. import archive
+    from ..models import Schedule
+
+    archived = archive.load(month, year)
+    if archived is not None:
+        return [
+            (row['location_id'], row['date'], location_label(row['location_name'], row['mall_name']),
+             row['shift'], row['employee_name'], row['gender'])
+            for row in archived
+        ]
+
+    first_day = date(year, month, 1)
+    last_day = date(year, month, calendar.monthrange(year, month)[1])
+    schedules = Schedule.objects.filter(
+        date__range=(first_day, last_day)
+    ).order_by('date', 'location', 'shift').values_list(
+        'location_id', 'location__name', 'location__mall_name',
+        'date', 'shift', 'employee__name', 'employee__gender'
+    )
+
+    rows = []
+    for location_id, name, mall_name, day, shift, employee, gender in schedules:
+        rows.append((location_id, day, location_label(name, mall_name), shift, employee, gender))
+    return rows
+
+
+register('xlsx', 'scheduling.exporters.xlsx')
+register('zip', 'scheduling.exporters.bundle')
+register('csv', 'scheduling.exporters.csv')
+register('ics', 'scheduling.exporters.ics')
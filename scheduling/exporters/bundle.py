@@ -0,0 +1,92 @@
+import calendar
+import multiprocessing
+import os
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from django.utils.text import slugify
+from . import month_rows
+from .workbook import build_workbook
+from .xlsx import sheet_title
+
+LABEL = 'Excel per location'
+CONTENT_TYPE = 'application/zip'
+EXTENSION = 'zip'
+FILENAME_SUFFIX = '_by_location'
+
+# Bundles larger than this are spooled to disk while they are being built
+BUNDLE_SPOOL_SIZE = 16 * 1024 * 1024
+
+# Workbooks are built by one pool shared by every request in the process.
+# Its workers start from a fresh interpreter (forkserver, or spawn where that
+# is unavailable) instead of forking a multi-threaded web worker.
+MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context(method))
+        return _pool
+
+
+def _discard_pool(pool):
+    """Forget a pool whose worker died, so the next export starts a new one"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def export(month, year, max_workers=None):
+    """Export one workbook per location, bundled into a ZIP file
+
+    The month is fetched once and partitioned by location; the workbooks are
+    then built in the shared worker pool, or in this process when
+    max_workers is 1. Returns a file object positioned at the start of the
+    archive.
+    """
+    partitions = {}
+    for location_id, *row in month_rows(month, year):
+        partitions.setdefault(location_id, (row[1], []))[1].append(tuple(row))
+
+    title = sheet_title(month, year)
+    month_name = calendar.month_name[month]
+    bundle = tempfile.SpooledTemporaryFile(max_size=BUNDLE_SPOOL_SIZE)
+
+    # Workbooks are already deflated, so the ZIP just stores them
+    with zipfile.ZipFile(bundle, 'w', zipfile.ZIP_STORED) as archive:
+        if len(partitions) <= 1 or max_workers == 1:
+            for location_id, (label, rows) in partitions.items():
+                archive.writestr(_filename(location_id, label, month_name, year), build_workbook(title, rows))
+        else:
+            pool = _get_pool()
+            try:
+                futures = {
+                    pool.submit(build_workbook, title, rows): (location_id, label)
+                    for location_id, (label, rows) in partitions.items()
+                }
+                for future in as_completed(futures):
+                    archive.writestr(
+                        _filename(*futures[future], month_name, year),
+                        future.result()
+                    )
+            except BrokenProcessPool:
+                _discard_pool(pool)
+                raise
+
+    bundle.seek(0)
+    return bundle
+
+
+def _filename(location_id, label, month_name, year):
+    # Location names are not unique; the id keeps two stores from sharing an entry
+    return f"schedule_{location_id}_{slugify(label) or 'location'}_{month_name}_{year}.xlsx"
@@ -0,0 +1,24 @@
+import csv
+from io import StringIO
+from . import HEADERS, month_rows
+
+LABEL = 'CSV'
+CONTENT_TYPE = 'text/csv'
+EXTENSION = 'csv'
+
+
+def export(month, year):
+    """Export the month as CSV with the same columns as the workbook"""
+    output = StringIO()
+    writer = csv.writer(output)
+    writer.writerow(HEADERS)
+    for _location_id, day, location, shift, employee, gender in month_rows(month, year):
+        writer.writerow([
+            day.strftime('%Y-%m-%d'),
+            day.strftime('%A'),
+            location,
+            shift,
+            employee,
+            'Female' if gender == 'F' else 'Male'
+        ])
+    return output.getvalue().encode('utf-8')
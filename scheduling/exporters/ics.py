@@ -0,0 +1,32 @@
+import calendar
+from datetime import date
+from .. import archive
+from ..ical import render_calendar, render_event, shift_times
+from ..models import Schedule
+
+LABEL = 'iCalendar'
+CONTENT_TYPE = 'text/calendar'
+EXTENSION = 'ics'
+
+
+def export(month, year):
+    """Export every shift of the month as one calendar"""
+    archived = archive.load(month, year)
+    if archived is not None:
+        schedules = [
+            (row['id'], row['date'], row['shift'], row['created_at'], row['location_name'],
+             row['mall_name'], row['address'], row['employee_name'])
+            for row in sorted(archived, key=lambda row: (row['date'], row['shift']))
+        ]
+    else:
+        first_day = date(year, month, 1)
+        last_day = date(year, month, calendar.monthrange(year, month)[1])
+        schedules = Schedule.objects.filter(
+            date__range=(first_day, last_day)
+        ).order_by('date', 'shift').values_list(
+            'id', 'date', 'shift', 'created_at',
+            'location__name', 'location__mall_name', 'location__address', 'employee__name'
+        )
+    times = shift_times()
+    name = f"Schedule {calendar.month_name[month]} {year}"
+    return render_calendar(name, [render_event(*row, times=times) for row in schedules]).encode('utf-8')
@@ -0,0 +1,106 @@
+from collections import defaultdict
+from io import BytesIO
+from openpyxl import Workbook
+from openpyxl.styles import Font, PatternFill, Border, Side
+from openpyxl.utils import get_column_letter
+from . import HEADERS
+
+# This module only depends on openpyxl so that process pool workers can
+# unpickle build_workbook without setting up Django.
+
+
+def build_workbook(title, rows):
+    """Build a schedule workbook from plain rows and return it as bytes
+
+    Each row is a (date, location, shift, employee name, gender) tuple.
+    """
+    wb = Workbook()
+    ws = wb.active
+    ws.title = title
+
+    # Styling
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+    weekend_fill = PatternFill(start_color="E6F3FF", end_color="E6F3FF", fill_type="solid")
+    border = Border(
+        left=Side(style='thin'),
+        right=Side(style='thin'),
+        top=Side(style='thin'),
+        bottom=Side(style='thin')
+    )
+
+    # Headers
+    for col, header in enumerate(HEADERS, 1):
+        cell = ws.cell(row=1, column=col, value=header)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.border = border
+
+    # Data
+    widths = [len(header) for header in HEADERS]
+    for row, (day, location, shift, employee, gender) in enumerate(rows, 2):
+        data = [
+            day.strftime('%Y-%m-%d'),
+            day.strftime('%A'),
+            location,
+            shift,
+            employee,
+            'Female' if gender == 'F' else 'Male'
+        ]
+        is_weekend = day.weekday() >= 5
+
+        for col, value in enumerate(data, 1):
+            cell = ws.cell(row=row, column=col, value=value)
+            cell.border = border
+
+            # Weekend highlighting
+            if is_weekend:
+                cell.fill = weekend_fill
+
+            widths[col - 1] = max(widths[col - 1], len(value))
+
+    # Auto-adjust column widths
+    for col, width in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(col)].width = min(width + 2, 50)
+
+    # Summary sheet
+    _create_summary_sheet(wb.create_sheet("Summary"), rows)
+
+    # Save to BytesIO
+    excel_file = BytesIO()
+    wb.save(excel_file)
+    return excel_file.getvalue()
+
+
+def _create_summary_sheet(ws, rows):
+    """Create summary statistics sheet"""
+    # Headers
+    ws['A1'] = 'Employee Statistics'
+    ws['A1'].font = Font(bold=True, size=14)
+
+    ws['A3'] = 'Employee'
+    ws['B3'] = 'Total Shifts'
+    ws['C3'] = 'Weekend Shifts'
+    ws['D3'] = 'Weekday Shifts'
+
+    # Style headers
+    for cell in ['A3', 'B3', 'C3', 'D3']:
+        ws[cell].font = Font(bold=True)
+
+    # Employee statistics
+    employee_stats = defaultdict(lambda: {'total': 0, 'weekend': 0, 'weekday': 0})
+
+    for day, _location, _shift, employee, _gender in rows:
+        employee_stats[employee]['total'] += 1
+        if day.weekday() >= 5:
+            employee_stats[employee]['weekend'] += 1
+        else:
+            employee_stats[employee]['weekday'] += 1
+
+    row = 4
+    for emp_name, stats in sorted(employee_stats.items()):
+        ws[f'A{row}'] = emp_name
+        ws[f'B{row}'] = stats['total']
+        ws[f'C{row}'] = stats['weekend']
+        ws[f'D{row}'] = stats['weekday']
+        row += 1
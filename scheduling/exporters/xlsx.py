@@ -0,0 +1,17 @@
+import calendar
+from . import month_rows
+from .workbook import build_workbook
+
+LABEL = 'Excel'
+CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+EXTENSION = 'xlsx'
+
+
+def sheet_title(month, year):
+    return f"Schedule {calendar.month_name[month]} {year}"
+
+
+def export(month, year):
+    """Export the month to a single workbook"""
+    rows = [row[1:] for row in month_rows(month, year)]
+    return build_workbook(sheet_title(month, year), rows)
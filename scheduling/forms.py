@@ -1,7 +1,8 @@
 # scheduling/forms.py
 from django import forms
+from django.db import router, transaction
 from .models import Employee, Location, Holiday, EmployeeOffDay
-from datetime import date
+from datetime import date, timedelta
 import calendar
 
 
@@ -49,6 +50,82 @@ class OffDayForm(forms.ModelForm):
             'reason': forms.TextInput(attrs={'class': 'form-control'}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Offer active employees only, but keep the current one when editing
+        active = Employee.objects.filter(is_active=True)
+        if self.instance.pk:
+            active = active | Employee.objects.filter(pk=self.instance.employee_id)
+        self.fields['employee'].queryset = active
+
+
+class OffDayRangeForm(forms.Form):
+    """Off days for one employee over a date range, optionally on some weekdays only"""
+    MAX_DAYS = 366
+    WEEKDAY_CHOICES = [(i, calendar.day_name[i]) for i in range(7)]
+
+    employee = forms.ModelChoiceField(
+        queryset=Employee.objects.filter(is_active=True),
+        widget=forms.HiddenInput(attrs={'id': 'id_employee'}),
+        error_messages={'required': 'Select an employee.'}
+    )
+    start_date = forms.DateField(widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
+    end_date = forms.DateField(widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
+    weekdays = forms.TypedMultipleChoiceField(
+        choices=WEEKDAY_CHOICES,
+        coerce=int,
+        required=False,
+        widget=forms.CheckboxSelectMultiple(attrs={'class': 'form-check-input'}),
+        help_text='Leave empty to include every day in the range'
+    )
+    reason = forms.CharField(
+        max_length=200,
+        required=False,
+        widget=forms.TextInput(attrs={'class': 'form-control'})
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start_date = cleaned_data.get('start_date')
+        end_date = cleaned_data.get('end_date')
+        if start_date and end_date:
+            if end_date < start_date:
+                raise forms.ValidationError('The end date must not be before the start date.')
+            if (end_date - start_date).days >= self.MAX_DAYS:
+                raise forms.ValidationError(f'A range can cover at most {self.MAX_DAYS} days.')
+        return cleaned_data
+
+    def dates(self):
+        """Dates selected by the range and weekday filter"""
+        start_date = self.cleaned_data['start_date']
+        weekdays = set(self.cleaned_data['weekdays'])
+        days = (self.cleaned_data['end_date'] - start_date).days + 1
+        for offset in range(days):
+            day = start_date + timedelta(days=offset)
+            if not weekdays or day.weekday() in weekdays:
+                yield day
+
+    def save(self):
+        """Create the off days in one bulk insert, skipping days already recorded
+
+        Returns the number of off days actually created.
+        """
+        employee = self.cleaned_data['employee']
+        recorded = EmployeeOffDay.objects.filter(
+            employee=employee,
+            date__range=(self.cleaned_data['start_date'], self.cleaned_data['end_date'])
+        )
+        with transaction.atomic(using=router.db_for_write(EmployeeOffDay)):
+            existing = set(recorded.values_list('date', flat=True))
+            off_days = [
+                EmployeeOffDay(employee=employee, date=day, reason=self.cleaned_data['reason'])
+                for day in self.dates() if day not in existing
+            ]
+            # ignore_conflicts skips days recorded meanwhile, so count what landed
+            before = recorded.count()
+            EmployeeOffDay.objects.bulk_create(off_days, ignore_conflicts=True)
+            return recorded.count() - before
+
 
 class ScheduleGenerationForm(forms.Form):
     MONTH_CHOICES = [(i, calendar.month_name[i]) for i in range(1, 13)]
@@ -0,0 +1,206 @@
+import calendar
+import hashlib
+import re
+import time as clock
+from datetime import date, datetime, time, timedelta
+from django.core.cache import cache
+from .models import Schedule, ShiftTemplate
+
+# Months around the current one included in an employee's feed
+FEED_MONTHS_BACK = 1
+FEED_MONTHS_AHEAD = 2
+
+# Rendered month chunks are keyed by version, so they can live as long as the
+# cache allows; a stale chunk is simply never looked up again. Versions are
+# timestamps rather than counters: a version key that the cache has evicted
+# is replaced by a new one instead of restarting from a value that may
+# still name an old chunk.
+CHUNK_TIMEOUT = 60 * 60 * 24 * 31
+PRODID = '-//Shift Scheduling//Employee Schedule//EN'
+
+
+def _parse_shift_times(shift):
+    """Turn a shift code such as '3PM-12AM' into (start, end) times"""
+    bounds = []
+    for hour, meridiem in re.findall(r'(\d{1,2})(AM|PM)', shift):
+        bounds.append(time(int(hour) % 12 + (12 if meridiem == 'PM' else 0)))
+    return tuple(bounds) if len(bounds) == 2 else (time(0), time(0))
+
+
+def shift_times():
+    """{shift code: (start, end)} for every shift template, in one query"""
+    return {
+        code: (start_time, end_time)
+        for code, start_time, end_time in ShiftTemplate.objects.values_list('code', 'start_time', 'end_time')
+    }
+
+
+def _month_bounds(month, year):
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def _add_months(month, year, delta):
+    index = year * 12 + month - 1 + delta
+    return index % 12 + 1, index // 12
+
+
+def _version_key(employee_id, month, year):
+    return f'ical:version:{employee_id}:{year}:{month}'
+
+
+# Covers what every feed shows besides the shifts: shift times and locations
+EPOCH_KEY = 'ical:epoch'
+
+
+def _chunk_key(employee_id, month, year, epoch, version):
+    return f'ical:chunk:{employee_id}:{year}:{month}:{epoch}:{version}'
+
+
+def _new_version():
+    return clock.time_ns()
+
+
+def invalidate_employee_feeds(employee_ids, month, year):
+    """Invalidate the cached feed month for each of the given employees"""
+    version = _new_version()
+    cache.set_many({_version_key(employee_id, month, year): version for employee_id in set(employee_ids)}, None)
+
+
+def invalidate_all_feeds():
+    """Invalidate every cached feed, after shift times or locations change"""
+    cache.set(EPOCH_KEY, _new_version(), None)
+
+
+def _escape(value):
+    return (value.replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\n', '\\n'))
+
+
+def _fold(line):
+    # RFC 5545 lines are limited to 75 octets; continuation lines start with a space
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line
+    parts = []
+    while len(encoded) > 75:
+        cut = 75 if not parts else 74
+        # Never split a multi-byte character
+        while cut and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+    parts.append(encoded.decode('utf-8'))
+    return '\r\n '.join(parts)
+
+
+def render_event(schedule_id, day, shift, created_at, location_name, mall_name, address, employee_name=None,
+                 times=None):
+    """Render one shift as a VEVENT block
+
+    times is the shift_times() mapping; shifts without a template fall back
+    to the times spelled out in their code.
+    """
+    start_time, end_time = (times or {}).get(shift) or _parse_shift_times(shift)
+    start = datetime.combine(day, start_time)
+    end = datetime.combine(day, end_time)
+    if end <= start:
+        # Shifts ending at midnight or later finish on the next day
+        end += timedelta(days=1)
+
+    location = f"{location_name} - {mall_name}" if mall_name else location_name
+    summary = f"{shift} shift at {location}"
+    if employee_name:
+        summary = f"{employee_name}: {summary}"
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:schedule-{schedule_id}@shift-scheduling',
+        f"DTSTAMP:{created_at.strftime('%Y%m%dT%H%M%SZ')}",
+        f"DTSTART:{start.strftime('%Y%m%dT%H%M%S')}",
+        f"DTEND:{end.strftime('%Y%m%dT%H%M%S')}",
+        f'SUMMARY:{_escape(summary)}',
+        f'LOCATION:{_escape(address or location)}',
+        'END:VEVENT',
+    ]
+    return '\r\n'.join(_fold(line) for line in lines) + '\r\n'
+
+
+def _render_months(employee_id, months):
+    """Render the VEVENT chunks of several months with a single query"""
+    first_day = _month_bounds(*months[0])[0]
+    last_day = _month_bounds(*months[-1])[1]
+    chunks = {month: [] for month in months}
+
+    # Served by the (employee, date) unique index
+    schedules = Schedule.objects.filter(
+        employee_id=employee_id,
+        date__range=(first_day, last_day)
+    ).order_by('date').values_list(
+        'id', 'date', 'shift', 'created_at',
+        'location__name', 'location__mall_name', 'location__address'
+    )
+    times = shift_times()
+    for row in schedules:
+        day = row[1]
+        if (day.month, day.year) in chunks:
+            chunks[(day.month, day.year)].append(render_event(*row, times=times))
+
+    return {month: ''.join(events) for month, events in chunks.items()}
+
+
+def render_calendar(name, event_blocks):
+    """Wrap rendered VEVENT blocks into a VCALENDAR document"""
+    return ''.join([
+        'BEGIN:VCALENDAR\r\n',
+        'VERSION:2.0\r\n',
+        f'PRODID:{PRODID}\r\n',
+        'CALSCALE:GREGORIAN\r\n',
+        _fold(f'X-WR-CALNAME:{_escape(name)}') + '\r\n',
+        *event_blocks,
+        'END:VCALENDAR\r\n',
+    ])
+
+
+def feed_months(today=None):
+    """The (month, year) pairs covered by an employee feed"""
+    today = today or date.today()
+    return [
+        _add_months(today.month, today.year, delta)
+        for delta in range(-FEED_MONTHS_BACK, FEED_MONTHS_AHEAD + 1)
+    ]
+
+
+def render_employee_feed(employee, months):
+    """Render an employee's iCalendar feed for the given months
+
+    Returns (body, etag). Months are rendered and cached independently, and
+    only the months missing from the cache are loaded from the database.
+    """
+    version_keys = [_version_key(employee.pk, month, year) for month, year in months]
+    stored_versions = cache.get_many([EPOCH_KEY, *version_keys])
+    # Evicted (or never set) versions get a new one, so no old chunk matches
+    lost_versions = {key: _new_version() for key in [EPOCH_KEY, *version_keys] if key not in stored_versions}
+    if lost_versions:
+        cache.set_many(lost_versions, None)
+        stored_versions.update(lost_versions)
+    epoch = stored_versions[EPOCH_KEY]
+    chunk_keys = [
+        _chunk_key(employee.pk, month, year, epoch, stored_versions[key])
+        for (month, year), key in zip(months, version_keys)
+    ]
+    chunks = cache.get_many(chunk_keys)
+
+    missing = [month for month, key in zip(months, chunk_keys) if key not in chunks]
+    if missing:
+        rendered = _render_months(employee.pk, missing)
+        fresh = {
+            key: rendered[month]
+            for month, key in zip(months, chunk_keys) if month in rendered
+        }
+        cache.set_many(fresh, CHUNK_TIMEOUT)
+        chunks.update(fresh)
+
+    body = render_calendar(f"Shifts - {employee.name}", [chunks[key] for key in chunk_keys])
+    etag = hashlib.md5(
+        f'{employee.pk}:{employee.name}:{chunk_keys}'.encode('utf-8')
+    ).hexdigest()
+    return body, f'"{etag}"'
@@ -0,0 +1,50 @@
+"""Single-flight schedule generation
+
+At most one generation per month runs at a time. The running GenerationJob
+row is the lock: a conditional unique constraint allows one running job per
+month, so a request that finds one already running waits for it and reuses
+its result instead of generating the month a second time.
+"""
+import time
+from datetime import timedelta
+from django.db import IntegrityError, router, transaction
+from django.utils import timezone
+from .models import GenerationJob
+
+# A job still running after this long belongs to a worker that died
+STALE_AFTER = timedelta(minutes=10)
+WAIT_TIMEOUT = 60
+POLL_INTERVAL = 0.2
+
+
+def claim(month, year):
+    """Start the month's generation job, or find the one already running
+
+    Returns (job, started). Only the caller that started the job may run the
+    generation; everyone else should wait() for it.
+    """
+    while True:
+        running = GenerationJob.objects.filter(month=month, year=year, status='running').first()
+        if running is not None:
+            if running.started_at > timezone.now() - STALE_AFTER:
+                return running, False
+            GenerationJob.objects.filter(pk=running.pk, status='running').update(
+                status='failed', error='Abandoned by its worker', finished_at=timezone.now()
+            )
+            continue
+
+        try:
+            with transaction.atomic(using=router.db_for_write(GenerationJob)):
+                return GenerationJob.objects.create(month=month, year=year), True
+        except IntegrityError:
+            # Another request claimed the month first; go back and wait for it
+            continue
+
+
+def wait(job, timeout=WAIT_TIMEOUT):
+    """Poll the job until it finishes or the timeout passes"""
+    deadline = time.monotonic() + timeout
+    while job.status == 'running' and time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        job.refresh_from_db()
+    return job
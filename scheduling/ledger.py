@@ -0,0 +1,126 @@
+from collections import defaultdict
+from django.db.models import Case, Count, F, IntegerField, Q, Value, When
+from django.utils import timezone
+from .models import Employee, EmployeeWorkload, Schedule, ScheduleArchive, ShiftTemplate
+
+WEEKEND_DAYS = [1, 7]  # __week_day numbering: Sunday is 1, Saturday is 7
+
+COUNTERS = ['total_shifts', 'weekend_shifts', 'late_shifts']
+
+
+def late_shifts():
+    """Codes of the shifts counted separately so that unpopular shifts are spread fairly too"""
+    return ShiftTemplate.objects.filter(is_late=True).values('code')
+
+
+def _tally_schedules(schedules, late_codes=None):
+    if late_codes is None:
+        late_codes = {row['code'] for row in late_shifts()}
+    tallies = defaultdict(lambda: [0, 0, 0])
+    for schedule in schedules:
+        tally = tallies[schedule.employee_id]
+        tally[0] += 1
+        tally[1] += schedule.date.weekday() >= 5
+        tally[2] += schedule.shift in late_codes
+    return tallies
+
+
+def _tally_queryset(queryset):
+    rows = queryset.order_by().values('employee_id').annotate(
+        total=Count('id'),
+        weekend=Count('id', filter=Q(date__week_day__in=WEEKEND_DAYS)),
+        late=Count('id', filter=Q(shift__in=late_shifts())),
+    )
+    return {row['employee_id']: [row['total'], row['weekend'], row['late']] for row in rows}
+
+
+def _apply(tallies, sign):
+    """Add the tallies to the ledger with one INSERT and one UPDATE
+
+    Must run inside the transaction that writes the schedule rows.
+    """
+    if not tallies:
+        return
+    EmployeeWorkload.objects.bulk_create(
+        [EmployeeWorkload(employee_id=employee_id) for employee_id in tallies],
+        ignore_conflicts=True
+    )
+
+    updates = {'updated_at': timezone.now()}
+    for index, counter in enumerate(COUNTERS):
+        whens = [
+            When(employee_id=employee_id, then=Value(sign * tally[index]))
+            for employee_id, tally in tallies.items() if tally[index]
+        ]
+        if whens:
+            updates[counter] = F(counter) + Case(*whens, default=Value(0), output_field=IntegerField())
+    EmployeeWorkload.objects.filter(employee_id__in=list(tallies)).update(**updates)
+
+
+def add(schedules, late_codes=None):
+    """Record newly written Schedule instances
+
+    Pass late_codes (a set of shift codes) to skip looking them up.
+    """
+    _apply(_tally_schedules(schedules, late_codes), 1)
+
+
+def remove(schedules):
+    """Forget Schedule instances that are about to be deleted or moved"""
+    _apply(_tally_schedules(schedules), -1)
+
+
+def tally_queryset(queryset):
+    """{employee_id: [total, weekend, late]} for the queryset's shifts"""
+    return _tally_queryset(queryset)
+
+
+def add_queryset(queryset):
+    _apply(_tally_queryset(queryset), 1)
+
+
+def remove_queryset(queryset):
+    _apply(_tally_queryset(queryset), -1)
+
+
+def move_queryset(queryset, employee_id):
+    """Move the queryset's shifts from their current employees to employee_id
+
+    Call before updating the rows.
+    """
+    tallies = _tally_queryset(queryset)
+    _apply(tallies, -1)
+    _apply({employee_id: [sum(column) for column in zip(*tallies.values())]} if tallies else {}, 1)
+
+
+def rebuild():
+    """Recompute the whole ledger from the schedule history, archived months included"""
+    tallies = _tally_queryset(Schedule.objects.all())
+    employee_ids = set(Employee.objects.values_list('pk', flat=True))
+    for archived in ScheduleArchive.objects.values_list('tallies', flat=True):
+        for employee_id, counters in archived.items():
+            if int(employee_id) in employee_ids:
+                tally = tallies.setdefault(int(employee_id), [0, 0, 0])
+                for index, value in enumerate(counters):
+                    tally[index] += value
+    EmployeeWorkload.objects.all().delete()
+    EmployeeWorkload.objects.bulk_create([
+        EmployeeWorkload(
+            employee_id=employee_id,
+            total_shifts=total,
+            weekend_shifts=weekend,
+            late_shifts=late
+        )
+        for employee_id, (total, weekend, late) in tallies.items()
+    ])
+    return len(tallies)
+
+
+def workloads(employee_ids):
+    """Current ledger rows as {employee_id: (total, weekend, late)}"""
+    return {
+        employee_id: tuple(counters)
+        for employee_id, *counters in EmployeeWorkload.objects.filter(
+            employee_id__in=employee_ids
+        ).values_list('employee_id', *COUNTERS)
+    }
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+# Rows sampled per index on SQLite; keeps ANALYZE fast on large tables
+SQLITE_ANALYSIS_LIMIT = 1000
+
+
+class Command(BaseCommand):
+    help = 'Refresh the query planner statistics of every database (run nightly)'
+
+    def handle(self, *args, **options):
+        aliases = ['default', *settings.TENANTS]
+        for alias in aliases:
+            connection = connections[alias]
+            with connection.cursor() as cursor:
+                if connection.vendor == 'sqlite':
+                    cursor.execute(f'PRAGMA analysis_limit = {SQLITE_ANALYSIS_LIMIT}')
+                cursor.execute('ANALYZE')
+            self.stdout.write(f'Analyzed {alias}')
+        self.stdout.write(self.style.SUCCESS(f'Analyzed {len(aliases)} databases'))
@@ -0,0 +1,68 @@
+import re
+from contextlib import nullcontext
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from scheduling import archive
+from scheduling.models import Schedule, ScheduleArchive
+from scheduling.tenants import is_tenant, use_tenant
+
+
+class Command(BaseCommand):
+    help = 'Move schedule months older than the retention window into compressed archive files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months', type=int, default=settings.SCHEDULE_RETENTION_MONTHS,
+            help='Months to keep in the Schedule table, counting the current one'
+        )
+        parser.add_argument('--restore', metavar='YYYY-MM', help='Move an archived month back instead')
+        parser.add_argument('--tenant', help='Tenant shard to work on (default database if omitted)')
+        parser.add_argument('--dry-run', action='store_true', help='List the months that would be archived')
+
+    def handle(self, *args, **options):
+        tenant = options['tenant']
+        if tenant and not is_tenant(tenant):
+            raise CommandError(f'Unknown tenant "{tenant}"')
+
+        with use_tenant(tenant) if tenant else nullcontext():
+            if options['restore']:
+                self.restore(options['restore'])
+            else:
+                self.archive(options['months'], options['dry_run'])
+
+    def archive(self, keep_months, dry_run):
+        if keep_months < 1:
+            raise CommandError('--months must be at least 1')
+        today = date.today()
+        index = today.year * 12 + today.month - 1 - (keep_months - 1)
+        cutoff = date(index // 12, index % 12 + 1, 1)
+
+        months = Schedule.objects.filter(date__lt=cutoff).dates('date', 'month')
+        archived = 0
+        for first_day in months:
+            if dry_run:
+                self.stdout.write(f'Would archive {first_day:%Y-%m}')
+                continue
+            entry = archive.archive_month(first_day.month, first_day.year)
+            if entry:
+                archived += 1
+                self.stdout.write(f'Archived {first_day:%Y-%m}: {entry.shift_count} shifts, {entry.size} bytes')
+
+        if not dry_run:
+            self.stdout.write(self.style.SUCCESS(f'Archived {archived} months older than {cutoff:%Y-%m}'))
+
+    def restore(self, value):
+        match = re.fullmatch(r'(\d{4})-(\d{2})', value)
+        if not match or not 1 <= int(match.group(2)) <= 12:
+            raise CommandError('--restore expects a month as YYYY-MM')
+        year, month = int(match.group(1)), int(match.group(2))
+        try:
+            restored, skipped = archive.restore_month(month, year)
+        except ScheduleArchive.DoesNotExist:
+            raise CommandError(f'{value} is not archived')
+        self.stdout.write(self.style.SUCCESS(f'Restored {restored} shifts for {value}'))
+        if skipped:
+            self.stdout.write(self.style.WARNING(f'Skipped {skipped} shifts of deleted employees or locations'))
@@ -0,0 +1,47 @@
+import json
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from scheduling.tenants import TENANT_NAME_RE
+
+SHARD_DIR = 'tenants'
+
+
+class Command(BaseCommand):
+    help = (
+        'Create the database shard for a new tenant, register it in TENANTS_FILE and migrate it. '
+        'Running workers pick the tenant up after a restart.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help='Tenant name, also used as its database alias')
+
+    def handle(self, *args, **options):
+        name = options['name']
+        if not TENANT_NAME_RE.match(name) or name in connections.settings:
+            raise CommandError(
+                f'Invalid tenant name "{name}": use lowercase letters, digits and underscores, '
+                'and avoid existing database aliases'
+            )
+
+        database_file = f'{SHARD_DIR}/{name}.sqlite3'
+        (settings.BASE_DIR / SHARD_DIR).mkdir(exist_ok=True)
+
+        # Register the alias for this process, reusing the default connection options
+        connections.settings[name] = {
+            **connections.settings['default'],
+            'NAME': settings.BASE_DIR / database_file,
+            'TEST': dict(connections.settings['default']['TEST'], NAME=None),
+        }
+        settings.TENANTS[name] = database_file
+        call_command('migrate', database=name, interactive=False, verbosity=options['verbosity'])
+
+        tenants_file = settings.TENANTS_FILE
+        tenants = json.loads(tenants_file.read_text()) if tenants_file.exists() else {}
+        tenants[name] = database_file
+        tenants_file.write_text(json.dumps(tenants, indent=2, sort_keys=True) + '\n')
+
+        self.stdout.write(self.style.SUCCESS(f'Created shard "{name}" at {database_file}'))
@@ -0,0 +1,95 @@
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# What a worker imports before serving its first request: the WSGI/ASGI
+# module (which sets Django up) and the URLconf with every view module.
+BOOT_SCRIPT = '''
+import importlib
+import {entry_point}
+from django.conf import settings
+importlib.import_module(settings.ROOT_URLCONF)
+'''
+
+EXPORTERS_SCRIPT = '''
+from scheduling import exporters
+for name in exporters.available_formats():
+    exporters.get_exporter(name)
+'''
+
+LINE_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def parse_importtime(output):
+    """Parse -X importtime output into (module, self us, cumulative us, depth) rows"""
+    rows = []
+    for line in output.splitlines():
+        match = LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return rows
+
+
+class Command(BaseCommand):
+    help = 'Measure the cold import time of a WSGI/ASGI worker with python -X importtime'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters per measurement')
+        parser.add_argument('--asgi', action='store_true', help='Measure the ASGI entry point instead of WSGI')
+        parser.add_argument('--top', type=int, default=10, help='Number of slowest top-level imports to list')
+
+    def handle(self, *args, **options):
+        entry_point = 'shift_scheduling.asgi' if options['asgi'] else 'shift_scheduling.wsgi'
+        boot = BOOT_SCRIPT.format(entry_point=entry_point)
+
+        self.stdout.write(f"Measuring {entry_point} over {options['runs']} runs")
+        boot_total, boot_rows = self.measure(boot, options['runs'])
+        exporters_total, exporter_rows = self.measure(boot + EXPORTERS_SCRIPT, options['runs'])
+
+        self.stdout.write('')
+        self.stdout.write(f'Worker boot:                   {boot_total / 1000:8.1f} ms (median)')
+        self.stdout.write(f'Worker boot + all exporters:   {exporters_total / 1000:8.1f} ms (median)')
+        self.stdout.write(f'Deferred until first export:   {(exporters_total - boot_total) / 1000:8.1f} ms')
+
+        booted = {row[0] for row in boot_rows}
+        deferred = [row for row in exporter_rows if row[0] not in booted and row[3] == 0]
+        if deferred:
+            self.stdout.write('')
+            self.stdout.write('Imported lazily by the exporter backends:')
+            for module, _self_us, cumulative_us, _depth in sorted(deferred, key=lambda row: -row[2])[:options['top']]:
+                self.stdout.write(f'  {cumulative_us / 1000:8.1f} ms  {module}')
+
+        self.stdout.write('')
+        self.stdout.write('Slowest top-level imports at boot:')
+        top_level = [row for row in boot_rows if row[3] == 0]
+        for module, _self_us, cumulative_us, _depth in sorted(top_level, key=lambda row: -row[2])[:options['top']]:
+            self.stdout.write(f'  {cumulative_us / 1000:8.1f} ms  {module}')
+
+    def measure(self, script, runs):
+        """Median total import time in microseconds and the rows of the last run"""
+        env = dict(os.environ)
+        env.setdefault('DJANGO_SETTINGS_MODULE', os.environ.get('DJANGO_SETTINGS_MODULE', 'shift_scheduling.settings'))
+
+        # Warm the bytecode cache so every measured run is a like-for-like cold start
+        self.run(script, env)
+        totals = []
+        rows = []
+        for _ in range(max(runs, 1)):
+            rows = parse_importtime(self.run(script, env))
+            totals.append(sum(row[1] for row in rows))
+        return statistics.median(totals), rows
+
+    def run(self, script, env):
+        completed = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', script],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True
+        )
+        if completed.returncode:
+            raise CommandError(f'Import failed:\n{completed.stderr[-2000:]}')
+        return completed.stderr
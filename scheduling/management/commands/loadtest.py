@@ -0,0 +1,255 @@
+import random
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from http.cookiejar import CookieJar
+from pathlib import Path
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import build_opener, HTTPCookieProcessor, HTTPRedirectHandler
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.db import connection, OperationalError
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+
+from scheduling.models import Employee, Location
+from scheduling.scheduler import ScheduleGenerator
+
+DEFAULT_MIX = 'dashboard=50,view_schedule=30,export_schedule=15,generate_schedule=5'
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class NoRedirectHandler(HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class LockMonitor:
+    """Counts SQLite lock errors and slow writes on every server connection"""
+
+    WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE')
+
+    def __init__(self, slow_write_ms):
+        self.slow_write = slow_write_ms / 1000
+        self.lock = threading.Lock()
+        self.lock_errors = 0
+        self.slow_writes = 0
+        self.write_time = 0.0
+        self.max_write = 0.0
+
+    def install(self, sender, connection, **kwargs):
+        connection.execute_wrappers.append(self)
+
+    def __call__(self, execute, sql, params, many, context):
+        if not sql.lstrip().upper().startswith(self.WRITE_PREFIXES):
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        except OperationalError as e:
+            if 'locked' in str(e):
+                with self.lock:
+                    self.lock_errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.write_time += elapsed
+                self.max_write = max(self.max_write, elapsed)
+                if elapsed >= self.slow_write:
+                    self.slow_writes += 1
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class Command(BaseCommand):
+    help = 'Load test the scheduling views against a synthetic database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--employees', type=int, default=60)
+        parser.add_argument('--locations', type=int, default=6)
+        parser.add_argument('--users', type=int, default=8, help='Concurrent client threads')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to run the workload')
+        parser.add_argument(
+            '--mix', default=DEFAULT_MIX,
+            help=f'Weighted view mix as view=weight pairs (default: {DEFAULT_MIX})'
+        )
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--slow-write-ms', type=float, default=100)
+
+    def handle(self, *args, **options):
+        mix = self.parse_mix(options['mix'])
+        today = date.today()
+        self.month, self.year = today.month, today.year
+
+        # Build a throwaway database the same way the test runner does
+        tmp_dir = tempfile.TemporaryDirectory()
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = str(Path(tmp_dir.name) / 'loadtest.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        # ...and a throwaway cache next to it, same backend as configured
+        cache_settings = override_settings(CACHES={
+            **settings.CACHES,
+            'default': {**settings.CACHES['default'], 'LOCATION': str(Path(tmp_dir.name) / 'cache')},
+        })
+        cache_settings.enable()
+
+        monitor = LockMonitor(options['slow_write_ms'])
+        server = None
+        try:
+            self.seed(options['employees'], options['locations'])
+
+            server = ThreadedWSGIServer(('127.0.0.1', 0), QuietRequestHandler)
+            server.set_app(WSGIHandler())
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            base_url = f'http://127.0.0.1:{server.server_port}'
+
+            connection_created.connect(monitor.install)
+            self.stdout.write(
+                f"Running {options['users']} users for {options['duration']:g}s against {base_url}"
+            )
+            results, elapsed = self.run_workload(base_url, mix, options)
+        finally:
+            connection_created.disconnect(monitor.install)
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+            cache_settings.disable()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            tmp_dir.cleanup()
+
+        self.report(results, elapsed, monitor)
+
+    def parse_mix(self, value):
+        mix = {}
+        for item in value.split(','):
+            name, _, weight = item.partition('=')
+            if name not in self.paths(1, 2000):
+                raise CommandError(f'Unknown view in --mix: {name}')
+            try:
+                mix[name] = float(weight or 1)
+            except ValueError:
+                raise CommandError(f'Invalid weight for {name}: {weight}')
+        return mix
+
+    def paths(self, month, year):
+        return {
+            'dashboard': '/',
+            'view_schedule': f'/schedule/{month}/{year}/',
+            'export_schedule': f'/export/{month}/{year}/',
+            'generate_schedule': '/generate/',
+        }
+
+    def seed(self, employee_count, location_count):
+        Employee.objects.bulk_create([
+            Employee(name=f'Employee {i:04d}', gender='F' if i % 2 else 'M')
+            for i in range(employee_count)
+        ])
+        Location.objects.bulk_create([
+            Location(name=f'Store {i:03d}', address=f'{i} Main Street', mall_name=f'Mall {i % 4}')
+            for i in range(location_count)
+        ])
+        self.location_ids = list(Location.objects.values_list('id', flat=True))
+        ScheduleGenerator(self.month, self.year, Location.objects.all()).generate()
+
+    def run_workload(self, base_url, mix, options):
+        names = list(mix)
+        weights = [mix[name] for name in names]
+        paths = self.paths(self.month, self.year)
+        deadline = time.perf_counter() + options['duration']
+        seed = options['seed']
+
+        def client(index):
+            rng = random.Random(None if seed is None else seed + index)
+            cookies = CookieJar()
+            opener = build_opener(HTTPCookieProcessor(cookies), NoRedirectHandler())
+            # Fetch the form once so generate requests carry a CSRF token
+            opener.open(base_url + paths['generate_schedule']).read()
+            csrf_token = next((c.value for c in cookies if c.name == 'csrftoken'), '')
+
+            samples = []
+            while time.perf_counter() < deadline:
+                name = rng.choices(names, weights)[0]
+                data = None
+                if name == 'generate_schedule':
+                    data = urlencode({
+                        'csrfmiddlewaretoken': csrf_token,
+                        'month': self.month,
+                        'year': self.year,
+                        'locations': self.location_ids,
+                    }, doseq=True).encode()
+
+                start = time.perf_counter()
+                try:
+                    with opener.open(base_url + paths[name], data=data, timeout=60) as response:
+                        response.read()
+                        status = response.status
+                except HTTPError as e:
+                    # Redirects surface here because they are not followed
+                    status = e.code
+                except URLError:
+                    status = 0
+                samples.append((name, time.perf_counter() - start, status))
+            return samples
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['users']) as executor:
+            results = [
+                sample
+                for samples in executor.map(client, range(options['users']))
+                for sample in samples
+            ]
+        return results, time.perf_counter() - started
+
+    def report(self, results, elapsed, monitor):
+        by_view = defaultdict(list)
+        errors = defaultdict(int)
+        for name, latency, status in results:
+            by_view[name].append(latency)
+            if status == 0 or status >= 400:
+                errors[name] += 1
+
+        self.stdout.write('')
+        self.stdout.write(
+            f"{'view':<20}{'requests':>10}{'errors':>8}{'err %':>8}"
+            f"{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}{'req/s':>9}"
+        )
+        for name in sorted(by_view):
+            latencies = sorted(by_view[name])
+            count = len(latencies)
+            self.stdout.write(
+                f"{name:<20}{count:>10}{errors[name]:>8}{100 * errors[name] / count:>8.1f}"
+                f"{percentile(latencies, 50) * 1000:>10.1f}"
+                f"{percentile(latencies, 90) * 1000:>10.1f}"
+                f"{percentile(latencies, 99) * 1000:>10.1f}"
+                f"{latencies[-1] * 1000:>10.1f}"
+                f"{count / elapsed:>9.1f}"
+            )
+
+        total_errors = sum(errors.values())
+        self.stdout.write('')
+        self.stdout.write(
+            f'Total: {len(results)} requests in {elapsed:.1f}s '
+            f'({len(results) / elapsed:.1f} req/s), {total_errors} errors'
+        )
+        self.stdout.write(
+            f'SQLite: {monitor.lock_errors} lock errors, {monitor.slow_writes} slow writes, '
+            f'{monitor.write_time:.2f}s total write time, {monitor.max_write * 1000:.1f} ms longest write'
+        )
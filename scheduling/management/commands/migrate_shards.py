@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Apply migrations to every tenant shard (and the default database)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skip-default', action='store_true', help='Leave the default database alone')
+
+    def handle(self, *args, **options):
+        aliases = list(settings.TENANTS)
+        if not options['skip_default']:
+            aliases.insert(0, 'default')
+
+        for alias in aliases:
+            self.stdout.write(f'Migrating {alias}')
+            call_command('migrate', database=alias, interactive=False, verbosity=options['verbosity'])
+        self.stdout.write(self.style.SUCCESS(f'Migrated {len(aliases)} databases'))
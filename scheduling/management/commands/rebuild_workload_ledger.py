@@ -0,0 +1,25 @@
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router, transaction
+
+from scheduling import ledger
+from scheduling.models import EmployeeWorkload
+from scheduling.tenants import is_tenant, use_tenant
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-employee workload ledger from the schedule history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', help='Tenant shard to work on (default database if omitted)')
+
+    def handle(self, *args, **options):
+        tenant = options['tenant']
+        if tenant and not is_tenant(tenant):
+            raise CommandError(f'Unknown tenant "{tenant}"')
+
+        with use_tenant(tenant) if tenant else nullcontext():
+            with transaction.atomic(using=router.db_for_write(EmployeeWorkload)):
+                employees = ledger.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt workload ledger for {employees} employees'))
@@ -0,0 +1,105 @@
+import hmac
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import Http404
+from .tenants import is_tenant, use_tenant
+
+
+class TenantMiddleware:
+    """Pick the tenant shard for a request
+
+    The tenant comes from the first label of the host name, e.g.
+    acme.example.com, or from the X-Tenant header when the reverse proxy
+    proves itself with TENANT_HEADER_SECRET in X-Tenant-Secret. Clients
+    cannot pick a tenant by sending the header themselves. Requests without
+    a tenant use the default database.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with use_tenant(self.resolve_tenant(request)):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with use_tenant(self.resolve_tenant(request)):
+            return await self.get_response(request)
+
+    def resolve_tenant(self, request):
+        name = request.headers.get('X-Tenant') if self.trusts_tenant_header(request) else None
+        if name:
+            if not is_tenant(name):
+                raise Http404('Unknown tenant')
+        else:
+            subdomain = request.get_host().split(':')[0].split('.')[0]
+            name = subdomain if is_tenant(subdomain) else None
+        request.tenant = name
+        return name
+
+    def trusts_tenant_header(self, request):
+        secret = settings.TENANT_HEADER_SECRET
+        return bool(secret) and hmac.compare_digest(
+            request.headers.get('X-Tenant-Secret', '').encode(), secret.encode()
+        )
+
+
+class ProfilingMiddleware:
+    """Profile a single request for a staff user who asks for it
+
+    Send the X-Profile: 1 header or add ?profile=1 to the URL. The view runs
+    under cProfile and tracemalloc, and the response carries an X-Profile-Id
+    header naming the files written (see scheduling.profiling). Must come
+    after AuthenticationMiddleware.
+
+    Only process_view does any work, and under ASGI it is a coroutine, so
+    requests that do not ask to be profiled skip the thread hop a sync
+    process_view would cost.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            self.process_view = self.process_view_async
+        else:
+            self.process_view = self.process_view_sync
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+    @staticmethod
+    def requested(request):
+        return request.headers.get('X-Profile') == '1' or request.GET.get('profile') == '1'
+
+    def process_view_sync(self, request, view_func, view_args, view_kwargs):
+        if not self.requested(request) or not request.user.is_staff:
+            return None
+        from . import profiling
+        return profiling.profile_view(request, view_func, view_args, view_kwargs)
+
+    async def process_view_async(self, request, view_func, view_args, view_kwargs):
+        if not self.requested(request) or not (await request.auser()).is_staff:
+            return None
+        from . import profiling
+        if iscoroutinefunction(view_func):
+            return await profiling.profile_async_view(request, view_func, view_args, view_kwargs)
+        # Same thread Django would run the sync view in, so cProfile sees it
+        return await sync_to_async(profiling.profile_view, thread_sensitive=True)(
+            request, view_func, view_args, view_kwargs
+        )
+
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduling', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='employeeoffday',
+            index=models.Index(fields=['date'], name='scheduling__date_6541b1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['date'], name='scheduling__date_b2ef62_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['location', 'date'], name='scheduling__locatio_728f68_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_workloads(apps, schema_editor):
+    Schedule = apps.get_model('scheduling', 'Schedule')
+    EmployeeWorkload = apps.get_model('scheduling', 'EmployeeWorkload')
+    rows = Schedule.objects.order_by().values('employee_id').annotate(
+        total=Count('id'),
+        weekend=Count('id', filter=Q(date__week_day__in=[1, 7])),
+        late=Count('id', filter=Q(shift='3PM-12AM')),
+    )
+    EmployeeWorkload.objects.bulk_create([
+        EmployeeWorkload(
+            employee_id=row['employee_id'],
+            total_shifts=row['total'],
+            weekend_shifts=row['weekend'],
+            late_shifts=row['late'],
+        )
+        for row in rows
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduling', '0002_schedule_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmployeeWorkload',
+            fields=[
+                ('employee', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='workload', serialize=False, to='scheduling.employee')),
+                ('total_shifts', models.PositiveIntegerField(default=0)),
+                ('weekend_shifts', models.PositiveIntegerField(default=0)),
+                ('late_shifts', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_workloads, migrations.RunPython.noop),
+    ]
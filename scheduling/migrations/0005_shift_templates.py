@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:30
+
+import django.db.models.deletion
+from datetime import time
+from django.db import migrations, models
+
+# The shifts that used to be hardcoded in Schedule.SHIFT_CHOICES
+DEFAULT_SHIFTS = [
+    ('10AM-7PM', '10:00 AM - 7:00 PM', time(10), time(19), False),
+    ('1PM-10PM', '1:00 PM - 10:00 PM', time(13), time(22), False),
+    ('3PM-12AM', '3:00 PM - 12:00 AM', time(15), time(0), True),
+]
+
+
+def seed_shift_templates(apps, schema_editor):
+    ShiftTemplate = apps.get_model('scheduling', 'ShiftTemplate')
+    ShiftTemplate.objects.using(schema_editor.connection.alias).bulk_create([
+        ShiftTemplate(code=code, label=label, start_time=start, end_time=end, is_late=is_late, order=order)
+        for order, (code, label, start, end, is_late) in enumerate(DEFAULT_SHIFTS)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduling', '0004_generationjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShiftTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=10, unique=True)),
+                ('label', models.CharField(max_length=50)),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('is_late', models.BooleanField(default=False, help_text='Late shifts are balanced separately and given to female employees only when needed')),
+                ('order', models.PositiveSmallIntegerField(default=0)),
+                ('is_active', models.BooleanField(default=True)),
+            ],
+            options={
+                'ordering': ['order', 'start_time'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='schedule',
+            name='shift',
+            field=models.CharField(max_length=10),
+        ),
+        migrations.CreateModel(
+            name='ShiftDemand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')])),
+                ('headcount', models.PositiveSmallIntegerField(default=1)),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shift_demands', to='scheduling.location')),
+                ('shift', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='demands', to='scheduling.shifttemplate')),
+            ],
+            options={
+                'ordering': ['location', 'weekday', 'shift__order'],
+                'unique_together': {('location', 'shift', 'weekday')},
+            },
+        ),
+        migrations.RunPython(seed_shift_templates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduling', '0005_shift_templates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.PositiveSmallIntegerField()),
+                ('year', models.PositiveSmallIntegerField()),
+                ('kind', models.CharField(choices=[('reassigned', 'Shift reassigned'), ('swapped', 'Shifts swapped'), ('unassigned', 'Shift unassigned'), ('updated', 'Shifts edited'), ('regenerated', 'Month regenerated'), ('job', 'Generation job')], max_length=20)),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['year', 'month', 'id'], name='scheduling__year_f587c6_idx'), models.Index(fields=['created_at'], name='scheduling__created_f8f22b_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduling', '0006_schedulechange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.PositiveSmallIntegerField()),
+                ('year', models.PositiveSmallIntegerField()),
+                ('path', models.CharField(max_length=255)),
+                ('shift_count', models.PositiveIntegerField(default=0)),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('tallies', models.JSONField(blank=True, default=dict)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-year', '-month'],
+                'unique_together': {('year', 'month')},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduling', '0007_schedulearchive'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='generationjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'running')), fields=('year', 'month'), name='one_running_generation_per_month'),
+        ),
+    ]
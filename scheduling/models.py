@@ -63,19 +63,65 @@ class EmployeeOffDay(models.Model):
     class Meta:
         unique_together = ['employee', 'date']
         ordering = ['date']
+        indexes = [
+            models.Index(fields=['date']),
+        ]
+
+
+class ShiftTemplate(models.Model):
+    """A shift that locations can be staffed for, e.g. 10AM-7PM"""
+    code = models.CharField(max_length=10, unique=True)
+    label = models.CharField(max_length=50)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    is_late = models.BooleanField(
+        default=False,
+        help_text='Late shifts are balanced separately and given to female employees only when needed'
+    )
+    order = models.PositiveSmallIntegerField(default=0)
+    is_active = models.BooleanField(default=True)
 
+    def __str__(self):
+        return self.label
 
-class Schedule(models.Model):
-    SHIFT_CHOICES = [
-        ('10AM-7PM', '10:00 AM - 7:00 PM'),
-        ('1PM-10PM', '1:00 PM - 10:00 PM'),
-        ('3PM-12AM', '3:00 PM - 12:00 AM'),
+    class Meta:
+        ordering = ['order', 'start_time']
+
+
+class ShiftDemand(models.Model):
+    """How many employees a location needs on a shift for one weekday
+
+    Without a demand row a location gets one employee per active shift.
+    """
+    WEEKDAY_CHOICES = [
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
     ]
 
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='shift_demands')
+    shift = models.ForeignKey(ShiftTemplate, on_delete=models.CASCADE, related_name='demands')
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES)
+    headcount = models.PositiveSmallIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.location.name} - {self.get_weekday_display()} - {self.shift.code}: {self.headcount}"
+
+    class Meta:
+        unique_together = ['location', 'shift', 'weekday']
+        ordering = ['location', 'weekday', 'shift__order']
+
+
+class Schedule(models.Model):
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE)
     location = models.ForeignKey(Location, on_delete=models.CASCADE)
     date = models.DateField()
-    shift = models.CharField(max_length=10, choices=SHIFT_CHOICES)
+    # ShiftTemplate.code; kept as text so past schedules survive template changes
+    shift = models.CharField(max_length=10)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -84,3 +130,106 @@ class Schedule(models.Model):
     class Meta:
         unique_together = ['employee', 'date']
         ordering = ['date', 'shift']
+        indexes = [
+            models.Index(fields=['date']),
+            models.Index(fields=['location', 'date']),
+        ]
+
+
+class EmployeeWorkload(models.Model):
+    """Running shift totals per employee across all months"""
+    employee = models.OneToOneField(
+        Employee, on_delete=models.CASCADE, primary_key=True, related_name='workload'
+    )
+    total_shifts = models.PositiveIntegerField(default=0)
+    weekend_shifts = models.PositiveIntegerField(default=0)
+    late_shifts = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.employee.name} - {self.total_shifts} shifts"
+
+
+class GenerationJob(models.Model):
+    """A schedule generation run and its timing report"""
+    STATUS_CHOICES = [
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+
+    month = models.PositiveSmallIntegerField()
+    year = models.PositiveSmallIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='running')
+    shifts_created = models.PositiveIntegerField(default=0)
+    unfilled_slots = models.PositiveIntegerField(default=0)
+    duration = models.FloatField(null=True, blank=True)
+    result = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.month:02d}/{self.year} - {self.get_status_display()}"
+
+    class Meta:
+        ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['year', 'month']),
+        ]
+        constraints = [
+            # Doubles as the per-month generation lock, see scheduling.jobs
+            models.UniqueConstraint(
+                fields=['year', 'month'],
+                condition=models.Q(status='running'),
+                name='one_running_generation_per_month'
+            ),
+        ]
+
+
+class ScheduleChange(models.Model):
+    """Change log behind the live schedule event stream"""
+    KIND_CHOICES = [
+        ('reassigned', 'Shift reassigned'),
+        ('swapped', 'Shifts swapped'),
+        ('unassigned', 'Shift unassigned'),
+        ('updated', 'Shifts edited'),
+        ('regenerated', 'Month regenerated'),
+        ('job', 'Generation job'),
+    ]
+
+    month = models.PositiveSmallIntegerField()
+    year = models.PositiveSmallIntegerField()
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    data = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.month:02d}/{self.year} - {self.get_kind_display()}"
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['year', 'month', 'id']),
+            models.Index(fields=['created_at']),
+        ]
+
+
+class ScheduleArchive(models.Model):
+    """Catalog entry for a month moved out of the Schedule table"""
+    month = models.PositiveSmallIntegerField()
+    year = models.PositiveSmallIntegerField()
+    # Relative to SCHEDULE_ARCHIVE_DIR
+    path = models.CharField(max_length=255)
+    shift_count = models.PositiveIntegerField(default=0)
+    size = models.PositiveIntegerField(default=0)
+    # {employee_id: [total, weekend, late]} so the ledger can be rebuilt without reading the file
+    tallies = models.JSONField(default=dict, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.month:02d}/{self.year} - {self.shift_count} shifts"
+
+    class Meta:
+        unique_together = ['year', 'month']
+        ordering = ['-year', '-month']
@@ -0,0 +1,235 @@
+"""On-demand profiling of single requests
+
+ProfilingMiddleware hands a request here when a staff user asks for it.
+The view runs under cProfile and tracemalloc and four files are written to
+PROFILE_DIR, named after the request:
+
+    <name>.collapsed   folded stacks for flamegraph.pl or speedscope
+    <name>.alloc.txt   top allocation sites and peak traced memory
+    <name>.prof        raw pstats dump, e.g. for snakeviz
+    <name>.json        request details listed on the profiles page
+
+cProfile records caller/callee pairs rather than full stacks, so the folded
+stacks spread each function's time over the paths that reach it in
+proportion to the time spent on each path.
+"""
+import cProfile
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from django.conf import settings
+from .tenants import get_current_tenant
+
+PROFILE_NAME_RE = re.compile(r'^[\w-]+$')
+FILE_SUFFIXES = {
+    'collapsed': '.collapsed',
+    'alloc': '.alloc.txt',
+    'prof': '.prof',
+}
+TRACE_FRAMES = 10
+TOP_ALLOCATIONS = 25
+# Paths carrying less time than this are left out of the folded stacks
+MIN_PATH_SECONDS = 0.00001
+MAX_DEPTH = 200
+
+# tracemalloc is process wide, so only one request is profiled at a time
+_lock = threading.Lock()
+
+
+def profile_dir():
+    return Path(settings.PROFILE_DIR)
+
+
+class _Capture:
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self.owns_tracemalloc = not tracemalloc.is_tracing()
+
+    def start(self):
+        if self.owns_tracemalloc:
+            tracemalloc.start(TRACE_FRAMES)
+        tracemalloc.reset_peak()
+        self.started = time.perf_counter()
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+        self.duration = time.perf_counter() - self.started
+        self.snapshot = tracemalloc.take_snapshot()
+        self.current_memory, self.peak_memory = tracemalloc.get_traced_memory()
+        if self.owns_tracemalloc:
+            tracemalloc.stop()
+
+
+def profile_view(request, view_func, args, kwargs):
+    """Run a sync view under the profilers; None if another profile is running"""
+    if not _lock.acquire(blocking=False):
+        return None
+    try:
+        capture = _Capture()
+        capture.start()
+        try:
+            response = view_func(request, *args, **kwargs)
+        finally:
+            capture.stop()
+        return _finish(request, view_func, capture, response, request.user.get_username())
+    finally:
+        _lock.release()
+
+
+async def profile_async_view(request, view_func, args, kwargs):
+    """Async counterpart of profile_view
+
+    The profiler sees everything the event loop runs meanwhile, so other
+    requests served concurrently can show up in the profile.
+    """
+    if not _lock.acquire(blocking=False):
+        return None
+    try:
+        capture = _Capture()
+        capture.start()
+        try:
+            response = await view_func(request, *args, **kwargs)
+        finally:
+            capture.stop()
+        return _finish(request, view_func, capture, response, (await request.auser()).get_username())
+    finally:
+        _lock.release()
+
+
+def _finish(request, view_func, capture, response, username):
+    match = request.resolver_match
+    view_name = (match.url_name if match else None) or view_func.__name__
+    created = datetime.now()
+    name = f"{created:%Y%m%d-%H%M%S}-{view_name}-{uuid.uuid4().hex[:6]}"
+
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    stats = pstats.Stats(capture.profiler)
+    stats.dump_stats(directory / f'{name}.prof')
+    (directory / f'{name}.collapsed').write_text(collapse_stacks(stats.stats), encoding='utf-8')
+    (directory / f'{name}.alloc.txt').write_text(allocation_summary(capture), encoding='utf-8')
+    (directory / f'{name}.json').write_text(json.dumps({
+        'name': name,
+        'created': created.isoformat(timespec='seconds'),
+        'method': request.method,
+        'path': request.get_full_path(),
+        'view': view_name,
+        'status': response.status_code,
+        'duration': round(capture.duration, 4),
+        'peak_memory': capture.peak_memory,
+        'user': username,
+        'tenant': get_current_tenant(),
+    }), encoding='utf-8')
+    _prune(directory)
+
+    response['X-Profile-Id'] = name
+    return response
+
+
+def _label(func):
+    filename, lineno, function = func
+    if filename == '~':
+        # Built-ins: '<built-in method time.sleep>'
+        label = function
+    else:
+        label = f'{function} ({_short_path(filename)}:{lineno})'
+    return label.replace(';', ',')
+
+
+def _short_path(filename):
+    path = filename.replace(os.sep, '/')
+    for marker in ('/site-packages/', f'{Path(settings.BASE_DIR).as_posix()}/', '/lib/python'):
+        if marker in path:
+            return path.split(marker, 1)[1]
+    return path
+
+
+def collapse_stacks(stats):
+    """Fold pstats data into 'frame;frame;frame microseconds' lines"""
+    callees = {}
+    for func, (_cc, _nc, _tt, _ct, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, {})[func] = edge
+    totals = {func: entry[3] for func, entry in stats.items()}
+
+    folded = Counter()
+
+    def walk(func, stack, on_stack, self_time, cumulative_time):
+        stack.append(_label(func))
+        on_stack.add(func)
+        folded[';'.join(stack)] += self_time
+        # Share of all of func's time that was spent on this path
+        share = cumulative_time / totals[func] if totals[func] else 0
+        if len(stack) < MAX_DEPTH:
+            for callee, (_cc, _nc, edge_self, edge_cumulative) in callees.get(func, {}).items():
+                if callee in on_stack or edge_cumulative * share < MIN_PATH_SECONDS:
+                    continue
+                walk(callee, stack, on_stack, edge_self * share, edge_cumulative * share)
+        on_stack.discard(func)
+        stack.pop()
+
+    for func, (_cc, _nc, self_time, cumulative_time, callers) in stats.items():
+        if not callers:
+            walk(func, [], set(), self_time, cumulative_time)
+
+    return ''.join(
+        f'{stack} {round(seconds * 1_000_000)}\n'
+        for stack, seconds in folded.items() if seconds * 1_000_000 >= 1
+    )
+
+
+def allocation_summary(capture):
+    snapshot = capture.snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    ])
+    statistics = snapshot.statistics('lineno')
+    lines = [
+        f'Duration:            {capture.duration:.4f}s',
+        f'Peak traced memory:  {capture.peak_memory / 1024:.1f} KiB',
+        f'Still allocated:     {sum(stat.size for stat in statistics) / 1024:.1f} KiB '
+        f'in {sum(stat.count for stat in statistics)} blocks',
+        '',
+        f'Top {TOP_ALLOCATIONS} allocation sites still alive at the end of the request:',
+    ]
+    for stat in statistics[:TOP_ALLOCATIONS]:
+        frame = stat.traceback[0]
+        lines.append(
+            f'{stat.size / 1024:10.1f} KiB {stat.count:8d} blocks  {_short_path(frame.filename)}:{frame.lineno}'
+        )
+    return '\n'.join(lines) + '\n'
+
+
+def _prune(directory):
+    metas = sorted(directory.glob('*.json'), reverse=True)
+    for meta in metas[settings.PROFILE_KEEP:]:
+        name = meta.name[:-len('.json')]
+        for suffix in [*FILE_SUFFIXES.values(), '.json']:
+            (directory / f'{name}{suffix}').unlink(missing_ok=True)
+
+
+def list_profiles(limit=None):
+    """Details of the saved profiles, newest first"""
+    directory = profile_dir()
+    if not directory.exists():
+        return []
+    metas = sorted(directory.glob('*.json'), reverse=True)[:limit]
+    return [json.loads(meta.read_text(encoding='utf-8')) for meta in metas]
+
+
+def profile_file(name, kind):
+    """Path of one of a profile's files, or None if it does not exist"""
+    if not PROFILE_NAME_RE.match(name) or kind not in FILE_SUFFIXES:
+        return None
+    path = profile_dir() / f'{name}{FILE_SUFFIXES[kind]}'
+    return path if path.exists() else None
@@ -0,0 +1,19 @@
+from .tenants import get_current_tenant
+
+
+class TenantRouter:
+    """Send every query to the current tenant's database
+
+    Outside of a tenant context (management commands, single-tenant
+    installs) the router abstains and Django falls back to 'default'.
+    """
+
+    def db_for_read(self, model, **hints):
+        return get_current_tenant()
+
+    def db_for_write(self, model, **hints):
+        return get_current_tenant()
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Rows never reference rows in another tenant's shard
+        return obj1._state.db == obj2._state.db
@@ -1,234 +1,249 @@
 from datetime import date, timedelta
 import calendar
+import heapq
+import logging
 import random
+import time
 from collections import defaultdict
-from .models import Employee, Location, Holiday, EmployeeOffDay, Schedule
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Border, Side
-from openpyxl.utils import get_column_letter
-from io import BytesIO
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from django.db import connections, router, transaction
+from . import ledger
+from .models import Employee, Location, Holiday, EmployeeOffDay, Schedule, ShiftDemand, ShiftTemplate
+
+logger = logging.getLogger(__name__)
+
+# How far ahead of the least loaded colleague earlier months can put an
+# employee when balancing a new month
+MAX_CARRIED_SHIFTS = 5
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+@dataclass
+class GenerationResult:
+    """Outcome of a generation run with per-phase timings"""
+    month: int
+    year: int
+    slots: int = 0
+    shifts_created: int = 0
+    # (date, location name, shift) of every slot nobody could take
+    unfilled: list = field(default_factory=list)
+    timings: dict = field(default_factory=dict)
+    queries: dict = field(default_factory=dict)
+
+    @property
+    def total_time(self):
+        return sum(self.timings.values())
+
+    @property
+    def slots_per_second(self):
+        return self.slots / self.total_time if self.total_time else 0.0
+
+    def unfilled_by_slot(self):
+        """Unfilled dates grouped by location and shift"""
+        grouped = defaultdict(list)
+        for day, location, shift in self.unfilled:
+            grouped[f'{location} / {shift}'].append(day.isoformat())
+        return dict(grouped)
+
+    def as_dict(self):
+        return {
+            'slots': self.slots,
+            'shifts_created': self.shifts_created,
+            'unfilled_count': len(self.unfilled),
+            'unfilled': self.unfilled_by_slot(),
+            'phases': [
+                {'name': phase, 'seconds': round(seconds, 4), 'queries': self.queries.get(phase, 0)}
+                for phase, seconds in self.timings.items()
+            ],
+            'total_time': round(self.total_time, 4),
+            'slots_per_second': round(self.slots_per_second, 1),
+        }
 
 
 class ScheduleGenerator:
-    SHIFTS = ['10AM-7PM', '1PM-10PM', '3PM-12AM']
-    PREFERRED_FEMALE_SHIFTS = ['10AM-7PM', '1PM-10PM']
-
-    def __init__(self, month, year, locations):
+    def __init__(self, month, year, locations, progress=None):
         self.month = month
         self.year = year
-        self.locations = list(locations)
-        self.employees = list(Employee.objects.filter(is_active=True))
-        self.holidays = set(Holiday.objects.filter(
-            date__month=month, date__year=year
-        ).values_list('date', flat=True))
-        self.off_days = defaultdict(set)
-
-        # Load employee off days
-        for off_day in EmployeeOffDay.objects.filter(
+        self.result = GenerationResult(month, year)
+        # Called with (phase, seconds) as each phase finishes
+        self.progress = progress
+
+        with self._phase('data_load'):
+            self.locations = list(locations)
+            self.employees = list(Employee.objects.filter(is_active=True))
+            self.holidays = set(Holiday.objects.filter(
                 date__month=month, date__year=year
-        ).select_related('employee'):
-            self.off_days[off_day.employee].add(off_day.date)
+            ).values_list('date', flat=True))
+            self.off_days = defaultdict(set)
+
+            # Load employee off days
+            for off_day in EmployeeOffDay.objects.filter(
+                    date__month=month, date__year=year
+            ).select_related('employee'):
+                self.off_days[off_day.employee].add(off_day.date)
+
+            self.shifts = list(ShiftTemplate.objects.filter(is_active=True))
+            self.demand_overrides = {
+                (location_id, shift_id, weekday): headcount
+                for location_id, shift_id, weekday, headcount in ShiftDemand.objects.filter(
+                    location__in=[location.pk for location in self.locations],
+                    shift__in=[shift.pk for shift in self.shifts]
+                ).values_list('location_id', 'shift_id', 'weekday', 'headcount')
+            }
+
+    @contextmanager
+    def _phase(self, name):
+        """Time a phase of the run and count the queries it issues"""
+        counter = _QueryCounter()
+        start = time.perf_counter()
+        with connections[router.db_for_write(Schedule)].execute_wrapper(counter):
+            yield
+        self.result.timings[name] = time.perf_counter() - start
+        self.result.queries[name] = counter.count
+        if self.progress:
+            self.progress(name, self.result.timings[name])
 
     def generate(self):
-        """Generate the complete monthly schedule"""
+        """Generate the complete monthly schedule and return a GenerationResult"""
         if not self.employees:
             raise ValueError("No active employees found")
         if not self.locations:
             raise ValueError("No locations selected")
+        if not self.shifts:
+            raise ValueError("No active shift templates found")
+
+        with self._phase('assignment'):
+            # Shifts already on the books this month, checked without a query
+            # per candidate. Loaded here rather than in __init__ so that rows
+            # the caller deleted before generating are not counted.
+            self.scheduled = set(Schedule.objects.filter(
+                date__month=self.month, date__year=self.year
+            ).values_list('employee_id', 'date'))
+            schedules = self._assign_month()
 
+        # Bulk create all schedules
+        with self._phase('bulk_insert'):
+            if schedules:
+                with transaction.atomic(using=router.db_for_write(Schedule)):
+                    Schedule.objects.bulk_create(schedules)
+                    ledger.add(schedules, late_codes={shift.code for shift in self.shifts if shift.is_late})
+
+        result = self.result
+        result.shifts_created = len(schedules)
+        result.slots = len(schedules) + len(result.unfilled)
+        logger.info(
+            "Generated %d/%d shifts for %02d/%d in %.3fs (%s); %d queries, %.0f slots/s",
+            result.shifts_created, result.slots, self.month, self.year, result.total_time,
+            ', '.join(f'{phase} {seconds:.3f}s' for phase, seconds in result.timings.items()),
+            sum(result.queries.values()), result.slots_per_second
+        )
+        if result.unfilled:
+            logger.warning(
+                "Could not fill %d slots for %02d/%d: %s",
+                len(result.unfilled), self.month, self.year, result.unfilled_by_slot()
+            )
+        return result
+
+    def _demand_grid(self, days):
+        """Headcount for every (day, location, shift) of the month
+
+        Returns a dense list indexed [day][location][shift], with all zeros on
+        holidays. Days share the rows of their weekday, so building it costs
+        7 x locations x shifts lookups however long the month is.
+        """
+        by_weekday = [
+            [
+                [self.demand_overrides.get((location.pk, shift.pk, weekday), 1) for shift in self.shifts]
+                for location in self.locations
+            ]
+            for weekday in range(7)
+        ]
+        closed = [[0] * len(self.shifts) for _location in self.locations]
+        return [
+            closed if current_date in self.holidays else by_weekday[current_date.weekday()]
+            for current_date in days
+        ]
+
+    def _assign_month(self):
         schedules = []
         month_days = calendar.monthrange(self.year, self.month)[1]
+        days = [date(self.year, self.month, day) for day in range(1, month_days + 1)]
+        demand = self._demand_grid(days)
 
-        # Track employee workload for balancing
-        employee_shifts = defaultdict(int)
-
-        for day in range(1, month_days + 1):
-            current_date = date(self.year, self.month, day)
-
-            # Skip holidays
-            if current_date in self.holidays:
-                continue
+        employee_load = self._starting_load()
 
+        for current_date, locations_demand in zip(days, demand):
             # Weekends have no off days (as per requirement)
             is_weekend = current_date.weekday() >= 5
 
-            # Track employees assigned today to prevent double-booking
-            assigned_today = set()
-
-            for location in self.locations:
-                for shift in self.SHIFTS:
-                    employee = self._assign_employee_to_shift(
-                        current_date, shift, location, employee_shifts, is_weekend, assigned_today
-                    )
-
-                    if employee:
-                        schedule = Schedule(
+            # Everyone who can still work today, filtered once per day rather
+            # than once per slot; employees leave the pool once assigned so
+            # nobody is double-booked
+            available = {
+                employee for employee in self.employees
+                if (is_weekend or current_date not in self.off_days[employee])
+                and (employee.pk, current_date) not in self.scheduled
+            }
+
+            for location, shifts_demand in zip(self.locations, locations_demand):
+                for shift, headcount in zip(self.shifts, shifts_demand):
+                    if not headcount:
+                        continue
+
+                    chosen = self._pick_employees(available, shift, headcount, employee_load, is_weekend)
+                    for employee in chosen:
+                        schedules.append(Schedule(
                             employee=employee,
                             location=location,
                             date=current_date,
-                            shift=shift
-                        )
-                        schedules.append(schedule)
-                        employee_shifts[employee] += 1
-                        assigned_today.add(employee)
-                    else:
-                        # Log when we can't assign anyone to a shift
-                        print(
-                            f"Warning: Could not assign employee to {location.name} on {current_date} for {shift} shift")
-
-        # Bulk create all schedules
-        if schedules:
-            Schedule.objects.bulk_create(schedules)
-        return len(schedules)
-
-    def _assign_employee_to_shift(self, current_date, shift, location, employee_shifts, is_weekend, assigned_today):
-        """Assign the best available employee to a shift"""
-        available_employees = []
-
-        for employee in self.employees:
-            # Skip if employee has off day (unless weekend)
-            if not is_weekend and current_date in self.off_days[employee]:
-                continue
-
-            # Skip if employee already assigned today
-            if employee in assigned_today:
-                continue
-
-            # Skip if employee already scheduled for this date
-            if Schedule.objects.filter(employee=employee, date=current_date).exists():
-                continue
-
-            # Gender preference for shifts
-            if employee.gender == 'F' and shift not in self.PREFERRED_FEMALE_SHIFTS:
-                # Female employees can work 3PM-12AM shift but it's not preferred
-                # Add them with lower priority
-                available_employees.append((employee, employee_shifts[employee], 1))
-            else:
-                # Preferred assignment
-                available_employees.append((employee, employee_shifts[employee], 0))
-
-        if not available_employees:
-            return None
-
-        # Sort by: preference (0 is better), then by workload (fewer shifts is better), then random
-        available_employees.sort(key=lambda x: (x[2], x[1], random.random()))
-
-        return available_employees[0][0]
-
-    def export_to_excel(self):
-        """Export schedule to Excel file"""
-        wb = Workbook()
-        ws = wb.active
-        ws.title = f"Schedule {calendar.month_name[self.month]} {self.year}"
-
-        # Styling
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-
-        # Headers
-        headers = ['Date', 'Day', 'Location', 'Shift', 'Employee', 'Gender']
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.border = border
-
-        # Data
-        schedules = Schedule.objects.filter(
-            date__month=self.month,
-            date__year=self.year
-        ).select_related('employee', 'location').order_by('date', 'location', 'shift')
-
-        row = 2
-        for schedule in schedules:
-            day_name = schedule.date.strftime('%A')
-
-            data = [
-                schedule.date.strftime('%Y-%m-%d'),
-                day_name,
-                str(schedule.location),
-                schedule.shift,
-                schedule.employee.name,
-                'Female' if schedule.employee.gender == 'F' else 'Male'
-            ]
-
-            for col, value in enumerate(data, 1):
-                cell = ws.cell(row=row, column=col, value=value)
-                cell.border = border
-
-                # Weekend highlighting
-                if schedule.date.weekday() >= 5:
-                    cell.fill = PatternFill(start_color="E6F3FF", end_color="E6F3FF", fill_type="solid")
-
-            row += 1
-
-        # Auto-adjust column widths
-        for column in ws.columns:
-            max_length = 0
-            column_letter = get_column_letter(column[0].column)
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-
-        # Summary sheet
-        summary_ws = wb.create_sheet("Summary")
-        self._create_summary_sheet(summary_ws)
-
-        # Save to BytesIO
-        excel_file = BytesIO()
-        wb.save(excel_file)
-        excel_file.seek(0)
-
-        return excel_file.getvalue()
-
-    def _create_summary_sheet(self, ws):
-        """Create summary statistics sheet"""
-        ws.title = "Summary"
-
-        # Headers
-        ws['A1'] = 'Employee Statistics'
-        ws['A1'].font = Font(bold=True, size=14)
-
-        ws['A3'] = 'Employee'
-        ws['B3'] = 'Total Shifts'
-        ws['C3'] = 'Weekend Shifts'
-        ws['D3'] = 'Weekday Shifts'
-
-        # Style headers
-        for cell in ['A3', 'B3', 'C3', 'D3']:
-            ws[cell].font = Font(bold=True)
-
-        # Employee statistics
-        row = 4
-        schedules = Schedule.objects.filter(
-            date__month=self.month,
-            date__year=self.year
-        ).select_related('employee')
-
-        employee_stats = defaultdict(lambda: {'total': 0, 'weekend': 0, 'weekday': 0})
-
-        for schedule in schedules:
-            emp = schedule.employee.name
-            employee_stats[emp]['total'] += 1
-            if schedule.date.weekday() >= 5:
-                employee_stats[emp]['weekend'] += 1
-            else:
-                employee_stats[emp]['weekday'] += 1
-
-        for emp_name, stats in sorted(employee_stats.items()):
-            ws[f'A{row}'] = emp_name
-            ws[f'B{row}'] = stats['total']
-            ws[f'C{row}'] = stats['weekend']
-            ws[f'D{row}'] = stats['weekday']
-            row += 1
+                            shift=shift.code
+                        ))
+                        load = employee_load[employee]
+                        load[0] += 1
+                        load[1] += is_weekend
+                        load[2] += shift.is_late
+                    available.difference_update(chosen)
+
+                    # Reported once at the end of the run
+                    for _missing in range(headcount - len(chosen)):
+                        self.result.unfilled.append((current_date, location.name, shift.code))
+
+        return schedules
+
+    def _starting_load(self):
+        """[total, weekend, late] shifts per employee to balance against
+
+        Starts from the ledger so that balancing carries over from earlier
+        months, measured from the team's lowest count and capped at
+        MAX_CARRIED_SHIFTS: a new hire is not booked every day until they
+        have caught up with colleagues' lifetime totals.
+        """
+        workloads = ledger.workloads([employee.pk for employee in self.employees])
+        counters = [workloads.get(employee.pk, (0, 0, 0)) for employee in self.employees]
+        lowest = [min(column) for column in zip(*counters)] if counters else []
+        return defaultdict(lambda: [0, 0, 0], {
+            employee: [min(count - floor, MAX_CARRIED_SHIFTS) for count, floor in zip(employee_counters, lowest)]
+            for employee, employee_counters in zip(self.employees, counters)
+        })
+
+    def _pick_employees(self, available, shift, headcount, employee_load, is_weekend):
+        """Pick the best headcount employees for a slot in a single pass"""
+        # Sort by: preference (female employees can work late shifts but it's
+        # not preferred), then by workload (fewer shifts is better), then by
+        # the weekend or late shifts already worked for those slots, then random
+        return heapq.nsmallest(headcount, available, key=lambda employee: (
+            shift.is_late and employee.gender == 'F',
+            employee_load[employee][0],
+            employee_load[employee][1] if is_weekend else 0,
+            employee_load[employee][2] if shift.is_late else 0,
+            random.random()
+        ))
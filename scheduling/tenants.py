@@ -0,0 +1,33 @@
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+
+# Tenant names double as database aliases and file names
+TENANT_NAME_RE = re.compile(r'^[a-z][a-z0-9_]{0,62}$')
+
+_current_tenant = ContextVar('current_tenant', default=None)
+
+
+def get_current_tenant():
+    """Name of the tenant the current request or task runs for, if any"""
+    return _current_tenant.get()
+
+
+@contextmanager
+def use_tenant(name):
+    """Route database access in this context to the tenant's shard"""
+    token = _current_tenant.set(name)
+    try:
+        yield
+    finally:
+        _current_tenant.reset(token)
+
+
+def is_tenant(name):
+    return name in settings.TENANTS
+
+
+def make_cache_key(key, key_prefix, version):
+    """Cache KEY_FUNCTION that keeps each tenant's cached data apart"""
+    return f'{key_prefix}:{version}:{get_current_tenant() or ""}:{key}'
@@ -1,3 +1,607 @@
-from django.test import TestCase
+import calendar
+import zipfile
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date, time as clock
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.admin import site
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
+from openpyxl import load_workbook
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from . import archive, assignments, exporters, ical, jobs, ledger
+from .admin import ScheduleAdminForm
+from .filters import EstimatedCountPaginator
+from .forms import OffDayRangeForm
+from .middleware import TenantMiddleware
+from .models import (
+    Employee, EmployeeOffDay, EmployeeWorkload, GenerationJob, Holiday, Location, Schedule, ScheduleArchive,
+    ShiftDemand, ShiftTemplate
+)
+from .scheduler import MAX_CARRIED_SHIFTS, ScheduleGenerator
+
+
+# Keep feed versions written by the tests out of the project's cache directory
+_cache_settings = override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'KEY_FUNCTION': 'scheduling.tenants.make_cache_key',
+}})
+
+
+def setUpModule():
+    _cache_settings.enable()
+
+
+def tearDownModule():
+    _cache_settings.disable()
+
+
+def create_staff(employees=3, locations=1):
+    """Employees and locations to schedule; returns the locations
+
+    Uses the shift templates seeded by the migrations, making sure at least
+    one exists after TransactionTestCase has flushed them.
+    """
+    ShiftTemplate.objects.get_or_create(code='10AM-7PM', defaults={
+        'label': '10:00 AM - 7:00 PM', 'start_time': clock(10), 'end_time': clock(19)
+    })
+    for index in range(employees):
+        Employee.objects.create(name=f'Employee {index}', gender='M')
+    return [Location.objects.create(name=f'Store {index}', address='1 Main Street') for index in range(locations)]
+
+
+class GenerateScheduleTests(TestCase):
+    def setUp(self):
+        self.locations = create_staff(employees=3, locations=1)
+        self.month = date.today().month
+        self.year = date.today().year
+        # Three employees for three shifts a day: everyone works every day
+        self.slots = calendar.monthrange(self.year, self.month)[1] * ShiftTemplate.objects.count()
+
+    def post_generate(self):
+        return self.client.post('/generate/', {
+            'month': self.month,
+            'year': self.year,
+            'locations': [location.pk for location in self.locations],
+        })
+
+    def test_regenerating_a_fully_staffed_month_refills_it(self):
+        self.assertEqual(ShiftTemplate.objects.count(), 3)
+        self.post_generate()
+        self.assertEqual(Schedule.objects.count(), self.slots)
+
+        self.post_generate()
+        self.assertEqual(Schedule.objects.count(), self.slots)
+        job = GenerationJob.objects.filter(month=self.month, year=self.year).first()
+        self.assertEqual(job.status, 'succeeded')
+        self.assertEqual(job.unfilled_slots, 0)
+
+
+class EmployeeFeedCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.location, = create_staff(employees=1)
+        self.employee = Employee.objects.get()
+        self.months = ical.feed_months()
+        self.today = date.today()
+
+    def add_shift(self):
+        return Schedule.objects.create(
+            employee=self.employee, location=self.location, date=self.today, shift='10AM-7PM'
+        )
+
+    def test_evicted_version_does_not_serve_stale_chunk(self):
+        stale, _etag = ical.render_employee_feed(self.employee, self.months)
+        # A row the feed has not seen, then the cache drops the version key
+        self.add_shift()
+        cache.delete(ical._version_key(self.employee.pk, self.today.month, self.today.year))
+
+        body, _etag = ical.render_employee_feed(self.employee, self.months)
+        self.assertNotIn('BEGIN:VEVENT', stale)
+        self.assertIn('BEGIN:VEVENT', body)
+
+    def test_shift_time_changes_invalidate_feeds(self):
+        self.add_shift()
+        before, etag = ical.render_employee_feed(self.employee, self.months)
+        ShiftTemplate.objects.filter(code='10AM-7PM').update(start_time=clock(9))
+        ical.invalidate_all_feeds()
+
+        after, new_etag = ical.render_employee_feed(self.employee, self.months)
+        self.assertIn('T100000', before)
+        self.assertIn('T090000', after)
+        self.assertNotEqual(etag, new_etag)
+
+
+class OffDayTests(TestCase):
+    def test_months_at_the_ends_of_the_calendar_fall_back_to_today(self):
+        for month, year in [(12, 9999), (1, 1)]:
+            response = self.client.get('/off-days/', {'month': month, 'year': year})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.context['year'], date.today().year)
+
+    def test_range_save_counts_only_new_off_days(self):
+        employee = Employee.objects.create(name='Employee', gender='F')
+        EmployeeOffDay.objects.create(employee=employee, date=date(2025, 1, 2))
+        form = OffDayRangeForm({
+            'employee': employee.pk, 'start_date': '2025-01-01', 'end_date': '2025-01-03'
+        })
+        self.assertTrue(form.is_valid())
+
+        dates = OffDayRangeForm.dates
+
+        def dates_recorded_meanwhile(form):
+            # Another request records a day after the form read the existing ones
+            EmployeeOffDay.objects.create(employee=employee, date=date(2025, 1, 3))
+            yield from dates(form)
+
+        with mock.patch.object(OffDayRangeForm, 'dates', dates_recorded_meanwhile):
+            self.assertEqual(form.save(), 1)
+        self.assertEqual(EmployeeOffDay.objects.filter(employee=employee).count(), 3)
+
+
+class WorkloadLedgerTests(TestCase):
+    def setUp(self):
+        self.locations = create_staff(employees=4, locations=1)
+        ScheduleGenerator(1, 2025, self.locations).generate()
+
+    def assertLedgerMatchesHistory(self):
+        employee_ids = list(Employee.objects.values_list('pk', flat=True))
+        kept = ledger.workloads(employee_ids)
+        ledger.rebuild()
+        self.assertEqual(kept, ledger.workloads(employee_ids))
+
+    def test_generate_reassign_swap_and_unassign_keep_the_ledger_in_step(self):
+        self.assertLedgerMatchesHistory()
+
+        # Four employees for three shifts a day leaves one free every day
+        shift = Schedule.objects.filter(date=date(2025, 1, 4)).first()
+        free = Employee.objects.exclude(schedule__date=shift.date).get()
+        assignments.reassign(shift.pk, free.pk)
+        self.assertLedgerMatchesHistory()
+
+        # A late shift for an early one, so the late counters move
+        first, second = Schedule.objects.filter(date=date(2025, 1, 5), shift__in=['10AM-7PM', '3PM-12AM'])
+        assignments.swap(first.pk, second.pk)
+        self.assertLedgerMatchesHistory()
+
+        assignments.unassign(Schedule.objects.first().pk)
+        self.assertLedgerMatchesHistory()
+
+    def test_deleting_a_location_removes_its_shifts_from_the_ledger(self):
+        location, = self.locations
+        site._registry[Location].delete_model(RequestFactory().post('/'), location)
+
+        self.assertFalse(Schedule.objects.exists())
+        self.assertEqual(set(EmployeeWorkload.objects.values_list('total_shifts', flat=True)), {0})
+
+    def test_new_hire_is_not_booked_every_day(self):
+        Schedule.objects.all().delete()
+        EmployeeWorkload.objects.update(total_shifts=300, weekend_shifts=90, late_shifts=100)
+        new_hire = Employee.objects.create(name='New Hire', gender='M')
+
+        ScheduleGenerator(2, 2025, self.locations).generate()
+        fair_share = Schedule.objects.count() / Employee.objects.count()
+        self.assertLessEqual(Schedule.objects.filter(employee=new_hire).count(), fair_share + MAX_CARRIED_SHIFTS)
+
+
+class ShiftChangeConflictTests(TestCase):
+    def setUp(self):
+        create_staff(employees=4, locations=1)
+        ScheduleGenerator(1, 2025, list(Location.objects.all())).generate()
+        self.employee = Employee.objects.get(name='Employee 0')
+        self.own = Schedule.objects.filter(employee=self.employee, date__day__gte=2).order_by('date').first()
+        # A shift of someone else on a day the employee also works
+        self.other = Schedule.objects.filter(
+            date__in=Schedule.objects.filter(employee=self.employee).exclude(date=self.own.date).values('date')
+        ).exclude(employee=self.employee).filter(
+            employee__in=Employee.objects.exclude(schedule__date=self.own.date)
+        ).first()
+
+    def test_swap_into_a_busy_day_is_refused(self):
+        response = self.client.post(f'/shifts/{self.own.pk}/swap/', {'other': self.other.pk})
+
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('already scheduled', response.json()['error'])
+        self.assertEqual(Schedule.objects.get(pk=self.own.pk).date, self.own.date)
+        self.assertEqual(Schedule.objects.get(pk=self.other.pk).date, self.other.date)
+
+    def test_write_racing_the_checks_is_a_conflict(self):
+        # As if a concurrent change booked the employee after the checks passed
+        with mock.patch.object(assignments, '_check_available'):
+            response = self.client.post(f'/shifts/{self.own.pk}/swap/', {'other': self.other.pk})
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Schedule.objects.get(pk=self.own.pk).date, self.own.date)
+        self.assertEqual(ledger.workloads([self.employee.pk])[self.employee.pk][0],
+                         Schedule.objects.filter(employee=self.employee).count())
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    def setUp(self):
+        location, = create_staff(employees=5)
+        shifts = [
+            Schedule.objects.create(employee=employee, location=location, date=date(2025, 1, 1), shift='10AM-7PM')
+            for employee in Employee.objects.all()
+        ]
+        shifts[0].delete()
+
+    def test_estimates_from_highest_id_before_analyze(self):
+        paginator = EstimatedCountPaginator(Schedule.objects.all(), 25)
+        self.assertEqual(paginator.count, Schedule.objects.order_by('-pk').first().pk)
+
+    def test_uses_planner_statistics_after_analyze(self):
+        call_command('analyze_databases', stdout=StringIO())
+        self.assertEqual(EstimatedCountPaginator(Schedule.objects.all(), 25).count, 4)
+
+    def test_filtered_lists_are_counted(self):
+        paginator = EstimatedCountPaginator(Schedule.objects.filter(employee__name='Employee 1'), 25)
+        self.assertEqual(paginator.count, 1)
+
+    def test_pages_walk_the_date_index_after_analyze(self):
+        call_command('analyze_databases', stdout=StringIO())
+        # What ANALYZE records for 1.5M shifts; with these SQLite drives a
+        # joined page query from the location table and sorts every shift
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM sqlite_stat1 WHERE tbl LIKE 'scheduling_%%'")
+            cursor.executemany('INSERT INTO sqlite_stat1 VALUES (%s, %s, %s)', [
+                ('scheduling_location', None, '60'),
+                ('scheduling_employee', None, '2000'),
+                ('scheduling_schedule', 'scheduling__locatio_728f68_idx', '1725570 1001 33'),
+                ('scheduling_schedule', 'scheduling__date_b2ef62_idx', '1687050 1001'),
+                ('scheduling_schedule', 'scheduling_schedule_location_id_43c7a35d', '1850240 1001'),
+                ('scheduling_schedule', 'scheduling_schedule_employee_id_02ad0af2', '1975536 501'),
+                ('scheduling_schedule', 'scheduling_schedule_employee_id_date_64859c0d_uniq', '1836900 501 1'),
+            ])
+            # Makes SQLite reload the statistics
+            cursor.execute('ANALYZE sqlite_schema')
+
+        queryset = Schedule.objects.select_related('employee', 'location').order_by('-date', '-pk')
+        with CaptureQueriesContext(connection) as queries:
+            list(EstimatedCountPaginator(queryset, 100).page(1))
+        ids_query, rows_query = [query['sql'] for query in queries.captured_queries][-2:]
+
+        ids_plan, rows_plan = self.query_plan(ids_query), self.query_plan(rows_query)
+        self.assertIn('INDEX scheduling__date_b2ef62_idx', ids_plan)
+        self.assertNotIn('TEMP B-TREE', ids_plan)
+        self.assertIn('USING INTEGER PRIMARY KEY', rows_plan)
+        self.assertNotIn('SCAN scheduling_location', rows_plan)
+
+    def query_plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return '\n'.join(row[-1] for row in cursor.fetchall())
+
+
+class ScheduleAdminTests(TestCase):
+    def setUp(self):
+        self.location, = create_staff(employees=2)
+        self.employee = Employee.objects.first()
+        Schedule.objects.create(employee=self.employee, location=self.location, date=date(2025, 1, 1), shift='10AM-7PM')
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+
+    def test_shift_filter_lists_templates_without_scanning_shifts(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/scheduling/schedule/', {'shift': '10AM-7PM'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 1)
+        self.assertFalse([query for query in queries.captured_queries if 'DISTINCT' in query['sql']])
+
+    def test_form_only_accepts_template_shift_codes(self):
+        data = {
+            'employee': self.employee.pk, 'location': self.location.pk, 'date': '2025-01-02', 'shift': '10AM-7PN'
+        }
+        form = ScheduleAdminForm(data)
+        self.assertFalse(form.is_valid())
+        self.assertIn('shift', form.errors)
+
+        self.assertTrue(ScheduleAdminForm({**data, 'shift': '10AM-7PM'}).is_valid())
+
+
+@override_settings(TENANTS={'acme': 'acme.sqlite3', 'globex': 'globex.sqlite3'}, ALLOWED_HOSTS=['*'])
+class TenantMiddlewareTests(SimpleTestCase):
+    def resolve(self, host='acme.example.com', **headers):
+        request = RequestFactory().get('/', HTTP_HOST=host, headers=headers)
+        return TenantMiddleware(lambda request: None).resolve_tenant(request)
+
+    def test_tenant_header_from_clients_is_ignored(self):
+        self.assertEqual(self.resolve(**{'X-Tenant': 'globex'}), 'acme')
+        self.assertIsNone(self.resolve(host='example.com', **{'X-Tenant': 'globex'}))
+
+    @override_settings(TENANT_HEADER_SECRET='s3cret')
+    def test_tenant_header_needs_the_proxy_secret(self):
+        self.assertEqual(self.resolve(**{'X-Tenant': 'globex', 'X-Tenant-Secret': 's3cret'}), 'globex')
+        self.assertEqual(self.resolve(**{'X-Tenant': 'globex', 'X-Tenant-Secret': 'guess'}), 'acme')
+
+
+class ShiftDemandGenerationTests(TestCase):
+    """February 2025 starts on a Saturday: the 3rd is a Monday, the 4th a Tuesday"""
+
+    def setUp(self):
+        self.location, = create_staff(employees=12)
+        self.early = ShiftTemplate.objects.get(code='10AM-7PM')
+        self.late = ShiftTemplate.objects.get(code='3PM-12AM')
+
+    def shifts_on(self, day, shift):
+        return Schedule.objects.filter(date=day, shift=shift.code).count()
+
+    def test_headcount_above_one_fills_every_seat_once(self):
+        ShiftDemand.objects.create(location=self.location, shift=self.early, weekday=0, headcount=3)
+        result = ScheduleGenerator(2, 2025, [self.location]).generate()
+
+        self.assertEqual(result.unfilled, [])
+        for monday in [3, 10, 17, 24]:
+            self.assertEqual(self.shifts_on(date(2025, 2, monday), self.early), 3)
+        self.assertEqual(self.shifts_on(date(2025, 2, 4), self.early), 1)
+        # 28 days x 3 shifts, plus two extra seats on each of the four Mondays
+        self.assertEqual(Schedule.objects.count(), 28 * 3 + 4 * 2)
+        self.assertEqual(Schedule.objects.values('employee', 'date').distinct().count(), Schedule.objects.count())
+
+    def test_zero_headcount_and_holidays_close_slots(self):
+        ShiftDemand.objects.create(location=self.location, shift=self.late, weekday=1, headcount=0)
+        Holiday.objects.create(name='Closed', date=date(2025, 2, 12))
+        ScheduleGenerator(2, 2025, [self.location]).generate()
+
+        self.assertFalse(Schedule.objects.filter(shift=self.late.code, date__week_day=3).exists())
+        self.assertEqual(self.shifts_on(date(2025, 2, 4), self.early), 1)
+        self.assertFalse(Schedule.objects.filter(date=date(2025, 2, 12)).exists())
+        self.assertEqual(Schedule.objects.count(), 27 * 3 - 4)
+
+    def test_late_shifts_go_to_male_employees_first(self):
+        ShiftTemplate.objects.exclude(pk=self.late.pk).update(is_active=False)
+        Employee.objects.all().delete()
+        for name, gender in [('Ana', 'F'), ('Bea', 'F'), ('Carl', 'M'), ('Dan', 'M')]:
+            Employee.objects.create(name=name, gender=gender)
+        ShiftDemand.objects.create(location=self.location, shift=self.late, weekday=0, headcount=3)
+        ScheduleGenerator(2, 2025, [self.location]).generate()
+
+        late_shifts = Schedule.objects.filter(shift=self.late.code)
+        self.assertEqual(set(late_shifts.exclude(date__week_day=2).values_list('employee__gender', flat=True)), {'M'})
+        # Mondays need three: both men and one woman
+        for monday in [3, 10, 17, 24]:
+            genders = sorted(late_shifts.filter(date=date(2025, 2, monday)).values_list('employee__gender', flat=True))
+            self.assertEqual(genders, ['F', 'M', 'M'])
+        # The men share the other days' single late shift evenly: 24 / 2 + 4 Mondays
+        self.assertEqual(
+            sorted(late_shifts.filter(employee__gender='M').values('employee').annotate(
+                shifts=Count('id')).values_list('shifts', flat=True)),
+            [16, 16]
+        )
+
+
+class ScheduleExportTests(TestCase):
+    def setUp(self):
+        self.locations = create_staff(employees=4, locations=1)
+        ScheduleGenerator(1, 2025, self.locations).generate()
+        self.shift_count = Schedule.objects.count()
+
+    def export(self, fmt):
+        response = self.client.get(f'/export/1/2025/{fmt}/')
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_every_format_exports_every_shift(self):
+        response, content = self.export('csv')
+        self.assertIn('schedule_January_2025.csv', response['Content-Disposition'])
+        lines = content.decode('utf-8').splitlines()
+        self.assertEqual(lines[0], ','.join(exporters.HEADERS))
+        self.assertEqual(len(lines) - 1, self.shift_count)
+
+        _response, content = self.export('ics')
+        self.assertEqual(content.count(b'BEGIN:VEVENT'), self.shift_count)
+
+        _response, content = self.export('xlsx')
+        sheet = load_workbook(BytesIO(content)).worksheets[0]
+        self.assertEqual(sheet.max_row - 1, self.shift_count)
+
+    def test_unknown_format_is_not_found(self):
+        self.assertEqual(self.client.get('/export/1/2025/pdf/').status_code, 404)
+
+    def test_archived_months_export_the_same_rows(self):
+        _response, before = self.export('csv')
+        archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, archive_dir)
+        with override_settings(SCHEDULE_ARCHIVE_DIR=archive_dir):
+            archive.archive_month(1, 2025)
+            _response, after = self.export('csv')
+        self.assertEqual(after, before)
+
+
+class BundleExportTests(TestCase):
+    def setUp(self):
+        # Two stores with the same name in the same mall
+        create_staff(employees=6, locations=0)
+        self.locations = [
+            Location.objects.create(name='Store', mall_name='City Mall', address=f'{number} Main Street')
+            for number in (1, 2)
+        ]
+        ScheduleGenerator(1, 2025, self.locations).generate()
+
+    def assertOneWorkbookPerLocation(self, bundle):
+        with zipfile.ZipFile(bundle) as archive_file:
+            names = archive_file.namelist()
+            self.assertEqual(len(names), len(self.locations))
+            for location in self.locations:
+                name, = [name for name in names if name.startswith(f'schedule_{location.pk}_')]
+                sheet = load_workbook(archive_file.open(name)).worksheets[0]
+                rows = [
+                    (day, shift, employee)
+                    for day, _weekday, _location, shift, employee, _gender in sheet.iter_rows(min_row=2, values_only=True)
+                ]
+                expected = [
+                    (day.isoformat(), shift, employee)
+                    for day, shift, employee in Schedule.objects.filter(location=location).order_by(
+                        'date', 'shift').values_list('date', 'shift', 'employee__name')
+                ]
+                self.assertEqual(rows, expected)
+
+    def test_each_location_gets_its_own_workbook(self):
+        self.assertOneWorkbookPerLocation(exporters.get_exporter('zip').export(1, 2025))
+
+    def test_workbooks_built_in_process_match(self):
+        self.assertOneWorkbookPerLocation(exporters.get_exporter('zip').export(1, 2025, max_workers=1))
+
+
+class ScheduleEventsTests(TestCase):
+    def test_wsgi_requests_do_not_stream(self):
+        response = self.client.get('/schedule/1/2025/events/')
+        self.assertEqual(response.status_code, 204)
+
+        response = self.client.get('/schedule/1/2025/')
+        self.assertFalse(response.context['live_updates'])
+        self.assertNotContains(response, 'EventSource')
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir)
+        settings_override = override_settings(SCHEDULE_ARCHIVE_DIR=self.archive_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.locations = create_staff(employees=4, locations=1)
+        ScheduleGenerator(1, 2025, self.locations).generate()
+        self.shift_count = Schedule.objects.count()
+
+    def archive_files(self):
+        return sorted(path.name for path in archive.archive_root().rglob('*.json.gz'))
+
+    def test_archive_and_restore(self):
+        entry = archive.archive_month(1, 2025)
+
+        self.assertEqual(entry.shift_count, self.shift_count)
+        self.assertFalse(Schedule.objects.exists())
+        self.assertEqual(len(archive.load(1, 2025)), self.shift_count)
+        response = self.client.get('/schedule/1/2025/')
+        self.assertEqual(len(response.context['schedules']), self.shift_count)
+
+        restored, skipped = archive.restore_month(1, 2025)
+        self.assertEqual((restored, skipped), (self.shift_count, 0))
+        self.assertEqual(Schedule.objects.count(), self.shift_count)
+        self.assertFalse(ScheduleArchive.objects.exists())
+        self.assertEqual(self.archive_files(), [])
+
+    def test_rearchiving_merges_new_rows(self):
+        archive.archive_month(1, 2025)
+        first_files = self.archive_files()
+        Schedule.objects.create(
+            employee=Employee.objects.first(), location=self.locations[0], date=date(2025, 1, 15), shift='10AM-7PM'
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            entry = archive.archive_month(1, 2025)
+
+        self.assertEqual(entry.shift_count, self.shift_count + 1)
+        self.assertEqual(len(archive.load(1, 2025)), self.shift_count + 1)
+        self.assertEqual(ScheduleArchive.objects.count(), 1)
+        self.assertFalse(Schedule.objects.exists())
+        # The merged archive is a new file and the old one is gone
+        self.assertEqual(len(self.archive_files()), 1)
+        self.assertNotEqual(self.archive_files(), first_files)
+
+    def test_archived_months_are_read_only(self):
+        archive.archive_month(1, 2025)
+        employees = list(Employee.objects.all())
+        late_row = Schedule.objects.create(
+            employee=employees[0], location=self.locations[0], date=date(2025, 1, 15), shift='10AM-7PM'
+        )
+
+        with self.assertRaises(assignments.ScheduleConflict):
+            assignments.reassign(late_row.pk, employees[1].pk)
+        self.assertEqual(Schedule.objects.get(pk=late_row.pk).employee, employees[0])
+
+
+class SingleFlightGenerationTests(TransactionTestCase):
+    """Concurrent requests for one month must share a single generation"""
+
+    def setUp(self):
+        self.location, = create_staff(employees=12)
+        self.month = date.today().month
+        self.year = date.today().year
+
+    def post_generate(self, responses):
+        try:
+            response = Client().post('/generate/', {
+                'month': self.month,
+                'year': self.year,
+                'locations': [self.location.pk],
+            })
+            responses.append(response)
+        finally:
+            connection.close()
+
+    def test_concurrent_requests_run_one_generation(self):
+        started = threading.Event()
+        release = threading.Event()
+        lock = threading.Lock()
+        calls = {'total': 0, 'running': 0, 'max_running': 0}
+        generate = ScheduleGenerator.generate
+
+        def slow_generate(generator):
+            with lock:
+                calls['total'] += 1
+                calls['running'] += 1
+                calls['max_running'] = max(calls['max_running'], calls['running'])
+            started.set()
+            # Hold the month until the other requests have arrived
+            release.wait(5)
+            try:
+                return generate(generator)
+            finally:
+                with lock:
+                    calls['running'] -= 1
+
+        responses = []
+        with mock.patch.object(ScheduleGenerator, 'generate', slow_generate), \
+                mock.patch.object(jobs, 'POLL_INTERVAL', 0.05):
+            leader = threading.Thread(target=self.post_generate, args=(responses,))
+            leader.start()
+            self.assertTrue(started.wait(5))
+
+            followers = [threading.Thread(target=self.post_generate, args=(responses,)) for _ in range(3)]
+            for follower in followers:
+                follower.start()
+            time.sleep(0.3)
+            release.set()
+
+            for thread in [leader, *followers]:
+                thread.join(10)
+
+        self.assertEqual(calls['total'], 1)
+        self.assertEqual(calls['max_running'], 1)
+        self.assertEqual(len(responses), 4)
+        for response in responses:
+            self.assertRedirects(
+                response, f'/schedule/{self.month}/{self.year}/', fetch_redirect_response=False
+            )
+
+        job = GenerationJob.objects.get(month=self.month, year=self.year)
+        self.assertEqual(job.status, 'succeeded')
+        self.assertEqual(Schedule.objects.count(), job.shifts_created)
+
+    def test_claim_reuses_running_job(self):
+        job, started = jobs.claim(self.month, self.year)
+        self.assertTrue(started)
+
+        again, started_again = jobs.claim(self.month, self.year)
+        self.assertFalse(started_again)
+        self.assertEqual(again.pk, job.pk)
+
+    def test_stale_job_is_abandoned(self):
+        job, _started = jobs.claim(self.month, self.year)
+        GenerationJob.objects.filter(pk=job.pk).update(started_at=job.started_at - jobs.STALE_AFTER)
+
+        fresh, started = jobs.claim(self.month, self.year)
+        self.assertTrue(started)
+        self.assertNotEqual(fresh.pk, job.pk)
+        self.assertEqual(GenerationJob.objects.get(pk=job.pk).status, 'failed')
@@ -7,6 +7,8 @@ urlpatterns = [
     path('employees/add/', views.add_employee, name='add_employee'),
     path('employees/edit/<int:employee_id>/', views.edit_employee, name='edit_employee'),
     path('employees/delete/<int:employee_id>/', views.delete_employee, name='delete_employee'),
+    path('employees/autocomplete/', views.employee_autocomplete, name='employee_autocomplete'),
+    path('employees/<int:employee_id>/calendar.ics', views.employee_calendar, name='employee_calendar'),
     path('locations/', views.manage_locations, name='manage_locations'),
     path('locations/add/', views.add_location, name='add_location'),
     path('locations/edit/<int:location_id>/', views.edit_location, name='edit_location'),
@@ -20,5 +22,13 @@ urlpatterns = [
     path('generate/', views.generate_schedule, name='generate_schedule'),
     path('schedule/', views.view_schedule, name='view_schedule'),
     path('schedule/<int:month>/<int:year>/', views.view_schedule, name='view_schedule'),
+    path('schedule/<int:month>/<int:year>/events/', views.schedule_events, name='schedule_events'),
+    path('shifts/<int:schedule_id>/reassign/', views.reassign_shift, name='reassign_shift'),
+    path('shifts/<int:schedule_id>/swap/', views.swap_shifts, name='swap_shifts'),
+    path('shifts/<int:schedule_id>/unassign/', views.unassign_shift, name='unassign_shift'),
+    path('profiles/', views.request_profiles, name='request_profiles'),
+    path('profiles/<str:name>/<str:kind>/', views.download_profile, name='download_profile'),
     path('export/<int:month>/<int:year>/', views.export_schedule, name='export_schedule'),
+    path('export/<int:month>/<int:year>/bundle/', views.export_schedule, {'fmt': 'zip'}, name='export_schedule_bundle'),
+    path('export/<int:month>/<int:year>/<str:fmt>/', views.export_schedule, name='export_schedule_format'),
 ]
\ No newline at end of file
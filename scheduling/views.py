@@ -1,16 +1,33 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib import messages
-from django.http import HttpResponse
+from django.contrib import admin, messages
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import (
+    HttpResponse, HttpResponseNotModified, FileResponse, JsonResponse, Http404, StreamingHttpResponse
+)
+from django.core.paginator import Paginator
+from django.urls import reverse
 from django.views.decorators.http import require_http_methods
-from django.db import transaction
-from .models import Employee, Location, Holiday, EmployeeOffDay, Schedule
+from django.db import router, transaction
+from django.utils import timezone
+from .models import Employee, Location, Holiday, EmployeeOffDay, Schedule, GenerationJob, ScheduleArchive
 from .forms import (
-    EmployeeForm, LocationForm, HolidayForm, OffDayForm,
+    EmployeeForm, LocationForm, HolidayForm, OffDayForm, OffDayRangeForm,
     ScheduleGenerationForm
 )
+from . import archive, ledger, assignments, events, jobs
+from . import exporters
 from .scheduler import ScheduleGenerator
+from .ical import render_employee_feed, invalidate_employee_feeds, invalidate_all_feeds, feed_months
+from .tenants import get_current_tenant
 import calendar
-from datetime import date
+import logging
+from datetime import MAXYEAR, MINYEAR, date, timedelta
+from io import BytesIO
+
+logger = logging.getLogger(__name__)
+
+OFF_DAYS_PER_PAGE = 25
+AUTOCOMPLETE_LIMIT = 20
 
 
 def dashboard(request):
@@ -99,6 +116,8 @@ def edit_location(request, location_id):
         form = LocationForm(request.POST, instance=location)
         if form.is_valid():
             form.save()
+            if form.has_changed():
+                invalidate_all_feeds()
             messages.success(request, 'Location updated successfully!')
             return redirect('manage_locations')
     else:
@@ -151,23 +170,66 @@ def edit_holiday(request, holiday_id):
 
 
 def manage_off_days(request):
-    """Manage employee off days"""
+    """Manage employee off days, one month at a time"""
+    today = date.today()
+    try:
+        month = int(request.GET.get('month', today.month))
+        year = int(request.GET.get('year', today.year))
+        first_day = date(year, month, 1)
+        # The previous and next month links must stay within the date range
+        if not MINYEAR < year < MAXYEAR:
+            raise ValueError('Year out of range')
+    except ValueError:
+        month, year = today.month, today.year
+        first_day = date(year, month, 1)
+
     if request.method == 'POST':
-        form = OffDayForm(request.POST)
+        form = OffDayRangeForm(request.POST)
         if form.is_valid():
-            form.save()
-            messages.success(request, 'Off day added successfully!')
-            return redirect('manage_off_days')
+            created = form.save()
+            messages.success(request, f'{created} off day(s) added successfully!')
+            start_date = form.cleaned_data['start_date']
+            return redirect(f"{reverse('manage_off_days')}?month={start_date.month}&year={start_date.year}")
     else:
-        form = OffDayForm()
+        form = OffDayRangeForm(initial={'start_date': today, 'end_date': today})
+
+    last_day = date(year, month, calendar.monthrange(year, month)[1])
+    off_days = EmployeeOffDay.objects.filter(
+        date__range=(first_day, last_day)
+    ).select_related('employee').order_by('date', 'employee__name')
+    page = Paginator(off_days, OFF_DAYS_PER_PAGE).get_page(request.GET.get('page'))
+
+    previous_month = first_day - timedelta(days=1)
+    next_month = last_day + timedelta(days=1)
+
+    # Redisplay the chosen name when the form comes back with errors
+    selected_employee = ''
+    employee_id = str(form['employee'].value() or '')
+    if form.is_bound and employee_id.isdigit():
+        selected_employee = Employee.objects.filter(pk=employee_id).values_list('name', flat=True).first() or ''
 
-    off_days = EmployeeOffDay.objects.select_related('employee').order_by('date')
     return render(request, 'scheduling/manage_off_days.html', {
         'form': form,
-        'off_days': off_days
+        'off_days': page,
+        'month': month,
+        'year': year,
+        'month_name': calendar.month_name[month],
+        'previous_month': previous_month,
+        'next_month': next_month,
+        'selected_employee': selected_employee,
     })
 
 
+def employee_autocomplete(request):
+    """Active employees matching a name fragment, for autocomplete inputs"""
+    term = request.GET.get('q', '').strip()
+    employees = Employee.objects.filter(is_active=True)
+    if term:
+        employees = employees.filter(name__icontains=term)
+    results = list(employees.order_by('name').values('id', 'name')[:AUTOCOMPLETE_LIMIT])
+    return JsonResponse({'results': results})
+
+
 def edit_off_day(request, off_day_id):
     """Edit off day"""
     off_day = get_object_or_404(EmployeeOffDay, id=off_day_id)
@@ -183,6 +245,52 @@ def edit_off_day(request, off_day_id):
     return render(request, 'scheduling/edit_off_day.html', {'form': form, 'off_day': off_day})
 
 
+def _finish_job(job, status, result=None, error=''):
+    job.status = status
+    job.error = error
+    job.finished_at = timezone.now()
+    job.duration = (job.finished_at - job.started_at).total_seconds()
+    if result is not None:
+        job.result = result.as_dict()
+        job.shifts_created = result.shifts_created
+        job.unfilled_slots = len(result.unfilled)
+    job.save()
+    events.publish('job', job.month, job.year, {
+        'id': job.id,
+        'status': status,
+        'shifts_created': job.shifts_created,
+        'unfilled_slots': job.unfilled_slots,
+        'duration': round(job.duration, 3),
+    })
+
+
+def _job_progress(job):
+    def progress(phase, seconds):
+        events.publish('job', job.month, job.year, {
+            'id': job.id, 'status': 'running', 'phase': phase, 'seconds': round(seconds, 4)
+        }, persist=False)
+    return progress
+
+
+def _joined_generation(request, form, job):
+    """Respond with the outcome of a generation another request ran"""
+    month_label = f'{calendar.month_name[job.month]} {job.year}'
+    if job.status == 'running':
+        messages.warning(request, f'{month_label} is still being generated; it will appear here when done.')
+    elif job.status == 'failed':
+        messages.error(request, f'Error generating schedule: {job.error}')
+        return render(request, 'scheduling/generate_schedule.html', {'form': form})
+    else:
+        messages.info(request, f'{month_label} was already being generated, so its result is shown instead.')
+        messages.success(
+            request,
+            f'Schedule generated successfully! {job.shifts_created} shifts assigned in {job.duration:.2f}s.'
+        )
+        if job.unfilled_slots:
+            messages.warning(request, f'{job.unfilled_slots} shifts could not be filled.')
+    return redirect('view_schedule', month=job.month, year=job.year)
+
+
 def generate_schedule(request):
     """Generate monthly schedule"""
     if request.method == 'POST':
@@ -191,20 +299,48 @@ def generate_schedule(request):
             month = int(form.cleaned_data['month'])
             year = int(form.cleaned_data['year'])
             locations = form.cleaned_data['locations']
-
-            # Clear existing schedules for this month
-            Schedule.objects.filter(
+            if ScheduleArchive.objects.filter(month=month, year=year).exists():
+                messages.error(request, f'{calendar.month_name[month]} {year} is archived; restore it before regenerating.')
+                return render(request, 'scheduling/generate_schedule.html', {'form': form})
+
+            # Only one generation per month at a time; a concurrent request
+            # waits for the running one and reports its result
+            job, started = jobs.claim(month, year)
+            if not started:
+                return _joined_generation(request, form, jobs.wait(job))
+            events.publish('job', month, year, {'id': job.id, 'status': 'running'})
+
+            month_schedules = Schedule.objects.filter(
                 date__month=month,
                 date__year=year
-            ).delete()
-
-            # Generate new schedule
-            generator = ScheduleGenerator(month, year, locations)
+            )
             try:
-                schedules_created = generator.generate()
-                messages.success(request, f'Schedule generated successfully! {schedules_created} shifts assigned.')
+                affected_employees = set(month_schedules.values_list('employee_id', flat=True))
+                generator = ScheduleGenerator(month, year, locations, progress=_job_progress(job))
+                # Replace the month atomically so the workload ledger stays in step
+                with transaction.atomic(using=router.db_for_write(Schedule)):
+                    # Clear existing schedules for this month
+                    ledger.remove_queryset(month_schedules)
+                    month_schedules.delete()
+
+                    # Generate new schedule
+                    result = generator.generate()
+                affected_employees.update(month_schedules.values_list('employee_id', flat=True))
+                invalidate_employee_feeds(affected_employees, month, year)
+                _finish_job(job, 'succeeded', result)
+                events.publish('regenerated', month, year, {'job': job.id, 'shifts_created': result.shifts_created})
+                events.prune()
+                messages.success(
+                    request,
+                    f'Schedule generated successfully! {result.shifts_created} shifts assigned'
+                    f' in {result.total_time:.2f}s.'
+                )
+                if result.unfilled:
+                    messages.warning(request, f'{len(result.unfilled)} shifts could not be filled.')
                 return redirect('view_schedule', month=month, year=year)
             except Exception as e:
+                logger.exception('Schedule generation failed for %02d/%d', month, year)
+                _finish_job(job, 'failed', error=str(e))
                 messages.error(request, f'Error generating schedule: {str(e)}')
     else:
         form = ScheduleGenerationForm()
@@ -219,35 +355,133 @@ def view_schedule(request, month=None, year=None):
     if year is None:
         year = date.today().year
 
-    schedules = Schedule.objects.filter(
-        date__month=month,
-        date__year=year
-    ).select_related('employee', 'location').order_by('date', 'shift')
+    # Archived months are read back from cold storage
+    archived = archive.load(month, year)
+    if archived is not None:
+        schedules = archive.as_schedules(sorted(archived, key=lambda row: (row['date'], row['shift'])))
+    else:
+        schedules = Schedule.objects.filter(
+            date__month=month,
+            date__year=year
+        ).select_related('employee', 'location').order_by('date', 'shift')
 
     month_name = calendar.month_name[month]
+    last_job = GenerationJob.objects.filter(month=month, year=year).first()
 
     return render(request, 'scheduling/view_schedule.html', {
         'schedules': schedules,
+        'archived': archived is not None,
+        'live_updates': archived is None and events.stream_available(request),
+        'last_job': last_job,
         'month': month,
         'year': year,
         'month_name': month_name
     })
 
 
-def export_schedule(request, month, year):
-    """Export schedule to Excel"""
-    generator = ScheduleGenerator(month, year, [])
-    excel_file = generator.export_to_excel()
+async def schedule_events(request, month, year):
+    """Stream changes to a month's schedule as server-sent events"""
+    if not 1 <= month <= 12:
+        raise Http404('Invalid month')
+    if not events.stream_available(request):
+        # 204 tells EventSource clients not to reconnect
+        return HttpResponse(status=204)
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    last_id = int(last_event_id) if last_event_id.isdigit() else None
+
+    response = StreamingHttpResponse(
+        events.stream(get_current_tenant(), month, year, last_id),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def export_schedule(request, month, year, fmt='xlsx'):
+    """Export schedule in one of the registered formats"""
+    try:
+        exporter = exporters.get_exporter(fmt)
+    except LookupError:
+        raise Http404(f'Unknown export format: {fmt}')
 
-    response = HttpResponse(
-        excel_file,
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    content = exporter.export(month, year)
+    if isinstance(content, bytes):
+        content = BytesIO(content)
+
+    suffix = getattr(exporter, 'FILENAME_SUFFIX', '')
+    return FileResponse(
+        content,
+        as_attachment=True,
+        filename=f"schedule_{calendar.month_name[month]}_{year}{suffix}.{exporter.EXTENSION}",
+        content_type=exporter.CONTENT_TYPE
     )
-    response['Content-Disposition'] = f'attachment; filename="schedule_{calendar.month_name[month]}_{year}.xlsx"'
 
+
+def employee_calendar(request, employee_id):
+    """iCalendar feed of an employee's shifts"""
+    employee = get_object_or_404(Employee, id=employee_id)
+    body, etag = render_employee_feed(employee, feed_months())
+
+    # Calendar clients poll frequently, let them revalidate cheaply
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='text/calendar; charset=utf-8')
+        response['Content-Disposition'] = f'inline; filename="shifts_{employee.id}.ics"'
+    response['ETag'] = etag
     return response
 
 
+def _shift_json(schedule, schedule_id=None):
+    return {
+        'id': schedule_id or schedule.id,
+        'date': schedule.date.isoformat(),
+        'shift': schedule.shift,
+        'location': {'id': schedule.location_id, 'name': str(schedule.location)},
+        'employee': {'id': schedule.employee_id, 'name': schedule.employee.name},
+    }
+
+
+def _assignment_error(error):
+    if isinstance(error, (Schedule.DoesNotExist, Employee.DoesNotExist)):
+        return JsonResponse({'error': 'Shift or employee not found.'}, status=404)
+    if isinstance(error, assignments.ScheduleConflict):
+        return JsonResponse({'error': str(error)}, status=409)
+    return JsonResponse({'error': 'Invalid request.'}, status=400)
+
+
+@require_http_methods(["POST"])
+def reassign_shift(request, schedule_id):
+    """Give a single shift to another employee"""
+    try:
+        schedule = assignments.reassign(schedule_id, int(request.POST.get('employee', '')))
+    except (ValueError, Schedule.DoesNotExist, Employee.DoesNotExist) as e:
+        return _assignment_error(e)
+    return JsonResponse({'shifts': [_shift_json(schedule)]})
+
+
+@require_http_methods(["POST"])
+def swap_shifts(request, schedule_id):
+    """Swap the employees of two shifts"""
+    try:
+        first, second = assignments.swap(schedule_id, int(request.POST.get('other', '')))
+    except (ValueError, Schedule.DoesNotExist) as e:
+        return _assignment_error(e)
+    return JsonResponse({'shifts': [_shift_json(first), _shift_json(second)]})
+
+
+@require_http_methods(["POST"])
+def unassign_shift(request, schedule_id):
+    """Remove a single shift"""
+    try:
+        schedule = assignments.unassign(schedule_id)
+    except Schedule.DoesNotExist as e:
+        return _assignment_error(e)
+    return JsonResponse({'shifts': [_shift_json(schedule, schedule_id)], 'deleted': True})
+
+
 @require_http_methods(["POST"])
 def delete_holiday(request, holiday_id):
     """Delete holiday"""
@@ -264,3 +498,27 @@ def delete_off_day(request, off_day_id):
     off_day.delete()
     messages.success(request, 'Off day deleted successfully!')
     return redirect('manage_off_days')
+
+
+@staff_member_required
+def request_profiles(request):
+    """Recent profiles written by ProfilingMiddleware"""
+    # Imported on use, like in the middleware, to keep cProfile, pstats and
+    # tracemalloc out of worker start-up
+    from . import profiling
+    return render(request, 'admin/scheduling/profiles.html', {
+        **admin.site.each_context(request),
+        'title': 'Request profiles',
+        'profiles': profiling.list_profiles(),
+    })
+
+
+@staff_member_required
+def download_profile(request, name, kind):
+    """Download one of a profile's files"""
+    from . import profiling
+    path = profiling.profile_file(name, kind)
+    if path is None:
+        raise Http404('Profile not found')
+    return FileResponse(path.open('rb'), as_attachment=True, filename=path.name)
+
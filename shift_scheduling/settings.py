@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import json
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -25,7 +27,7 @@ SECRET_KEY = 'django-insecure-e8veqkqqw6g#4+#jtgyuu)@0l7u_)jx16(6!p!wg_vgp0uzod6
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
-ALLOWED_HOSTS = ['localhost', '127.0.0.1']
+ALLOWED_HOSTS = ['.localhost', '127.0.0.1']
 
 # Application definition
 
@@ -41,10 +43,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'scheduling.middleware.TenantMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'scheduling.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -80,6 +84,53 @@ DATABASES = {
     }
 }
 
+# Tenants (retail chains) each get their own SQLite database so that one
+# chain's writes never wait on another's. tenants.json maps a tenant name,
+# which is also its database alias, to a database file relative to BASE_DIR.
+# Manage it with the create_shard and migrate_shards commands.
+
+TENANTS_FILE = BASE_DIR / 'tenants.json'
+TENANTS = json.loads(TENANTS_FILE.read_text()) if TENANTS_FILE.exists() else {}
+
+for _tenant, _database_file in TENANTS.items():
+    DATABASES[_tenant] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / _database_file,
+    }
+
+DATABASE_ROUTERS = ['scheduling.routers.TenantRouter']
+
+# The tenant is taken from the subdomain. A reverse proxy may name it in the
+# X-Tenant header instead, but only if it also sends this secret in
+# X-Tenant-Secret; without a secret the header is ignored.
+
+TENANT_HEADER_SECRET = os.environ.get('TENANT_HEADER_SECRET', '')
+
+# Months older than the retention window are moved out of the Schedule
+# table into compressed files by the archive_schedules command.
+
+SCHEDULE_ARCHIVE_DIR = BASE_DIR / 'archive'
+SCHEDULE_RETENTION_MONTHS = 12
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# Shared by all worker processes on the host, so a feed invalidated by one
+# worker is not served stale by another. Use a shared server cache (Redis,
+# Memcached) when workers run on several hosts.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'KEY_FUNCTION': 'scheduling.tenants.make_cache_key',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -122,3 +173,30 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Request profiles written by ProfilingMiddleware; only the newest
+# PROFILE_KEEP are kept.
+
+PROFILE_DIR = BASE_DIR / 'profiles'
+PROFILE_KEEP = 50
+
+
+# Logging
+# https://docs.djangoproject.com/en/5.2/topics/logging/
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'scheduling': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}